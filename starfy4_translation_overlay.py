@@ -1,20 +1,34 @@
 import sys
 import os
 import json
+import math
 import ctypes
+import ctypes.util
+import importlib.util
 import time
+import itertools
+import threading
+import traceback
+import struct
+import zlib
+import mmap
+import queue
+import csv
+from collections import OrderedDict, deque, namedtuple
 from ctypes import wintypes
 
-import pyautogui
-import imagehash
-import vlc
+STARTUP_TIME = time.perf_counter()  # taken before the heavy imports, for the startup report
+
+import numpy as np
 from PIL import Image
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QCheckBox, QPlainTextEdit, QLabel,
-    QVBoxLayout, QHBoxLayout, QLineEdit
+    QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton
+)
+from PyQt5.QtCore import Qt, QTimer, QRect, QObject, QThread, QMetaObject, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import (
+    QPainter, QColor, QFont, QFontDatabase, QTextDocument, QIntValidator, QImage
 )
-from PyQt5.QtCore import Qt, QTimer, QRect
-from PyQt5.QtGui import QPainter, QColor, QFont, QFontDatabase, QTextDocument, QIntValidator
 
 
 def app_dir() -> str:
@@ -28,11 +42,24 @@ def app_dir() -> str:
 def beside_exe(filename: str) -> str:
     return os.path.join(app_dir(), filename)
 
+
+def startup_message(stage):
+    """Log line for the startup timing report."""
+    return f"Startup: {stage} at {(time.perf_counter() - STARTUP_TIME) * 1000:.0f} ms"
+
 # Database and monitoring settings
 HASH_DB_FILE = "hash_db.json"
 UNSEEN_DIR = "untranslated"
-CHECK_INTERVAL = 10  # milliseconds
+CHECK_INTERVAL = 10  # milliseconds, starting poll interval
+MIN_INTERVAL = 1  # milliseconds, fastest poll while text is changing
+IDLE_INTERVAL = 100  # milliseconds, slowest poll while the screen is static
+CPU_BUDGET = 10  # percent of total CPU (all cores) the tool may use
+RENDER_CACHE_MB = 64  # memory cap for pre-rendered translation images
+PREFETCH_AHEAD = 8  # entries after a match to pre-render, in database order
 UI_RECT = (1300, 80, 320, 600)
+CAPTURE_BACKEND = "auto"  # "auto", "gdi", "mss", "xshm", "pyautogui" or "file:<frames dir or .npy>"
+CAPTURE_BENCH_FRAMES = 10  # grabs per backend when auto-selecting
+FILE_CACHE_MB = 256  # memory cap for converted frames when replaying recordings
 OVERLAY_CONFIG_FILE = "overlay_regions.json"
 
 # CG configuration
@@ -49,24 +76,40 @@ DEFAULT_REGION_CFG = []
 # Hash color overrides are loaded from overlay_regions.json.
 DEFAULT_HASH_COLOR_OVERRIDES = {}
 
+# Native DS mode is switched on by a "native" section in overlay_regions.json:
+#   "native": {"screens": {"top": [x, y, w, h], "bottom": [x, y, w, h]},
+#              "database": "hash_db_native.json"}
+# Screens are where the emulator draws each DS screen on the desktop.
+DEFAULT_NATIVE_CFG = None
+DS_SCREEN_SIZE = (256, 192)
+NATIVE_HASH_DB_FILE = "hash_db_native.json"
+
+# Scenes (see SceneTracker) are loaded from overlay_regions.json.
+DEFAULT_SCENE_CFG = []
+
 def load_overlay_config():
     config_path = beside_exe(OVERLAY_CONFIG_FILE)
     if not os.path.exists(config_path):
-        return DEFAULT_REGION_CFG, DEFAULT_HASH_COLOR_OVERRIDES
+        return DEFAULT_REGION_CFG, DEFAULT_HASH_COLOR_OVERRIDES, DEFAULT_NATIVE_CFG, DEFAULT_SCENE_CFG
 
     try:
         with open(config_path, encoding="utf-8") as f:
             data = json.load(f)
     except (OSError, json.JSONDecodeError) as exc:
         print(f"[WARN] Failed to load {config_path}: {exc}")
-        return DEFAULT_REGION_CFG, DEFAULT_HASH_COLOR_OVERRIDES
+        return DEFAULT_REGION_CFG, DEFAULT_HASH_COLOR_OVERRIDES, DEFAULT_NATIVE_CFG, DEFAULT_SCENE_CFG
 
     regions = data.get("regions", DEFAULT_REGION_CFG)
     overrides = data.get("hash_color_overrides", DEFAULT_HASH_COLOR_OVERRIDES)
-    return regions, overrides
+    native = data.get("native", DEFAULT_NATIVE_CFG)
+    scenes = data.get("scenes", DEFAULT_SCENE_CFG)
+    return regions, overrides, native, scenes
 
 
-REGION_CFG, HASH_COLOR_OVERRIDES = load_overlay_config()
+REGION_CFG, HASH_COLOR_OVERRIDES, NATIVE_CFG, SCENE_CFG = load_overlay_config()
+if NATIVE_CFG:
+    # Native-resolution crops hash differently, so they keep their own database
+    HASH_DB_FILE = NATIVE_CFG.get("database", NATIVE_HASH_DB_FILE)
 
 NDS_FAMILY = "Courier New"  # Default font, replaced if NDS.ttf is found
 
@@ -97,15 +140,628 @@ def save_database(db):
         json.dump(db, f, indent=2, ensure_ascii=False)
 
 
+CG_TAGS = ("__START_CG__", "__STOP_CG__")
+
+
+def entry_text(entry):
+    """Translation text of a database entry.
+
+    Entries are either a plain string (shared by every region) or
+    {"text": ..., "regions": [...]} scoped to the regions it was captured from,
+    optionally with "aliases": near-duplicate hashes that mean the same entry.
+    """
+    return entry if isinstance(entry, str) else entry.get("text", "")
+
+
+def entry_regions(entry):
+    """Region indexes an entry belongs to, or None if it is shared by all."""
+    if isinstance(entry, str):
+        return None
+    return entry.get("regions")
+
+
+def entry_aliases(entry):
+    """Other hash keys that share this entry."""
+    return [] if isinstance(entry, str) else entry.get("aliases", [])
+
+
+def alias_table(db):
+    """Map alias key -> the key of the entry it belongs to."""
+    return {alias: key for key, entry in db.items() for alias in entry_aliases(entry)}
+
+
+def compiled_db_path(json_path=None):
+    """Compiled database file that sits next to a JSON database."""
+    return os.path.splitext(json_path or HASH_DB_FILE)[0] + ".bin"
+
+
+def load_compiled_database():
+    """Load the database for lookups.
+
+    Uses the compiled file when it is newer than both the JSON database and
+    the overlay config (which holds the colour overrides it folds in),
+    otherwise compiles the JSON in memory so edits show up straight away.
+    """
+    path = compiled_db_path()
+    sources = [p for p in (HASH_DB_FILE, beside_exe(OVERLAY_CONFIG_FILE)) if os.path.exists(p)]
+    if os.path.exists(path) and all(os.path.getmtime(path) >= os.path.getmtime(p) for p in sources):
+        try:
+            return CompiledDatabase.open(path)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Ignoring {path}: {e}")
+    return CompiledDatabase.from_json(load_database(), HASH_COLOR_OVERRIDES)
+
+
 def normalize_image(img):
     return img
 
 
 def get_perceptual_hash(img):
     """Get perceptual hash of an image."""
+    import imagehash  # pulls in SciPy, so only loaded when something needs it
+
     return imagehash.phash(normalize_image(img))
 
 
+# COMPILED DATABASE
+#
+# Little-endian layout, version 3 (version 2 has a single mask word and 0 in
+# its place in the header, version 1 is version 2 without aliases):
+#   header   magic "SF4H", version u16, region mask words w u16, entry count u32,
+#            text bytes u32, CRC-32 of everything after the header u32, pad
+#   keys     u64[n]   sorted hash values
+#   regions  u64[n*w] region bitmask, bit r of word r // 64 for region r,
+#                     every bit set for shared entries
+#   offsets  u32[n+1] start of each entry's text in the text table
+#   colors   u32[n]   ARGB colour override
+#   order    u32[n]   entry indexes in the JSON's original (capture) order
+#   flags    u8[n]    DB_HAS_COLOR, DB_COLOR_ONLY, DB_ALIAS
+#   text     UTF-8 string table
+#
+# Aliases are full copies of their entry, placed right after it in capture
+# order, so lookups need nothing special and decompiling can regroup them.
+
+DB_MAGIC = b"SF4H"
+DB_VERSION = 3
+DB_READABLE_VERSIONS = (1, 2, 3)
+DB_HEADER = struct.Struct("<4sHHIII4x")
+DB_HAS_COLOR = 1
+DB_COLOR_ONLY = 2  # colour override for a hash that has no database entry
+DB_ALIAS = 4  # near-duplicate hash of the entry before it in capture order
+ALL_REGIONS = (1 << 64) - 1  # one mask word with every region's bit set
+REGION_WORD_BITS = 64
+
+
+def region_words(region_count):
+    """Number of uint64 words a bitmask of region_count regions takes."""
+    return max(1, -(-region_count // REGION_WORD_BITS))
+
+
+def region_bitmask(regions, words):
+    """uint64[words] bitmask of a region list, every bit set if shared (None)."""
+    if regions is None:
+        return np.full(words, ALL_REGIONS, dtype=np.uint64)
+    mask = np.zeros(words, dtype=np.uint64)
+    for region in regions:
+        if not 0 <= region < words * REGION_WORD_BITS:
+            raise ValueError(f"Region {region} is out of range")
+        mask[region // REGION_WORD_BITS] |= np.uint64(1 << region % REGION_WORD_BITS)
+    return mask
+
+
+def bitmask_regions(mask):
+    """Region list of a uint64[words] bitmask, None if every bit is set (shared)."""
+    words = mask.tolist()
+    if all(word == ALL_REGIONS for word in words):
+        return None
+    return [
+        w * REGION_WORD_BITS + bit
+        for w, word in enumerate(words) for bit in range(REGION_WORD_BITS) if word >> bit & 1
+    ]
+
+
+def has_region(masks, region):
+    """Which rows of an (n, words) bitmask array have region set.
+
+    Regions past the last word are only in the shared (all bits set) rows.
+    """
+    word, bit = divmod(region, REGION_WORD_BITS)
+    if word >= masks.shape[1]:
+        return (masks == ALL_REGIONS).all(axis=1)
+    return (masks[:, word] & np.uint64(1 << bit)) != 0
+
+
+def _db_sections(count, words=1):
+    """(name, dtype, length) of each array section in file order."""
+    return (
+        ("keys", "<u8", count),
+        ("regions", "<u8", count * words),
+        ("offsets", "<u4", count + 1),
+        ("colors", "<u4", count),
+        ("order", "<u4", count),
+        ("flags", "u1", count),
+    )
+
+
+def pack_database(db, color_overrides=None):
+    """Compile a JSON database (and hash colour overrides) into the binary format."""
+    color_overrides = color_overrides or {}
+    entries = []
+    aliases = alias_table(db)
+    for key, entry in db.items():
+        text, regions = entry_text(entry), entry_regions(entry)
+        entries.append((int(key, 16), len(entries), text, regions, 0, key))
+        for alias in entry_aliases(entry):
+            if alias in db or aliases[alias] != key:
+                raise ValueError(f"Alias {alias} of {key} is also another entry or alias")
+            entries.append((int(alias, 16), len(entries), text, regions, DB_ALIAS, key))
+    for key in color_overrides:
+        if key not in db and key not in aliases:
+            entries.append((int(key, 16), len(entries), "", None, DB_COLOR_ONLY, key))
+    entries.sort()
+
+    count = len(entries)
+    scoped = [region for entry in entries if entry[3] is not None for region in entry[3]]
+    words = region_words(max(scoped, default=-1) + 1)
+    keys = np.zeros(count, "<u8")
+    regions = np.full((count, words), ALL_REGIONS, "<u8")
+    offsets = np.zeros(count + 1, "<u4")
+    colors = np.zeros(count, "<u4")
+    order = np.zeros(count, "<u4")
+    flags = np.zeros(count, "u1")
+    text = bytearray()
+
+    for index, (value, position, entry_str, entry_region_list, entry_flags, owner) in enumerate(entries):
+        keys[index] = value
+        order[position] = index
+        offsets[index] = len(text)
+        text += entry_str.encode("utf-8")
+        if entry_region_list is not None:
+            try:
+                regions[index] = region_bitmask(entry_region_list, words)
+            except ValueError as e:
+                raise ValueError(f"{e} in {hash_to_key(value)}") from None
+        # Aliases take their entry's colour; one set on the alias itself is dropped
+        color = color_overrides.get(owner)
+        if color is not None:
+            colors[index] = create_qcolor(color).rgba()
+            entry_flags |= DB_HAS_COLOR
+        flags[index] = entry_flags
+    offsets[count] = len(text)
+
+    body = b"".join(
+        array.tobytes() for array in (keys, regions, offsets, colors, order, flags)
+    ) + text
+    header = DB_HEADER.pack(DB_MAGIC, DB_VERSION, words, count, len(text), zlib.crc32(body))
+    return header + body
+
+
+class CompiledDatabase:
+    """Read-only view over a compiled database, looked up by integer hash.
+
+    Opening reads the whole body once to check its CRC, but no entry is
+    decoded up front: lookups go straight to the arrays (binary search over
+    the sorted keys) and only decode the text they hit. Safe to read from
+    any thread.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer  # keeps an mmap alive while the arrays point into it
+        self._positions = None
+        if len(buffer) < DB_HEADER.size:
+            raise ValueError("Truncated database header")
+        magic, version, words, count, text_bytes, checksum = DB_HEADER.unpack_from(buffer)
+        if magic != DB_MAGIC:
+            raise ValueError("Not a compiled hash database")
+        if version not in DB_READABLE_VERSIONS:
+            raise ValueError(f"Unsupported database version {version}")
+        if version < 3:
+            words = 1
+        elif words < 1:
+            raise ValueError("Database has no region mask words")
+        body = memoryview(buffer)[DB_HEADER.size:]
+        if zlib.crc32(body) != checksum:
+            raise ValueError("Database checksum mismatch")
+
+        offset = DB_HEADER.size
+        for name, dtype, length in _db_sections(count, words):
+            array = np.frombuffer(buffer, dtype, length, offset)
+            setattr(self, name, array)
+            offset += array.nbytes
+        self.regions = self.regions.reshape(count, words)
+        self._text_start = offset
+        self.text = memoryview(buffer)[offset:offset + text_bytes]
+        if len(self.text) != text_bytes:
+            raise ValueError("Truncated database text table")
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a compiled database file."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_json(cls, db, color_overrides=None):
+        """Compile a JSON database in memory."""
+        return cls(pack_database(db, color_overrides))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def entry_count(self):
+        """Number of entries as in the JSON, without aliases and bare colour overrides."""
+        return int(np.count_nonzero((self.flags & (DB_ALIAS | DB_COLOR_ONLY)) == 0))
+
+    def find(self, value):
+        """Index of the entry for an integer hash, or -1."""
+        index = int(np.searchsorted(self.keys, np.uint64(value)))
+        if index < len(self.keys) and int(self.keys[index]) == value:
+            return index
+        return -1
+
+    def __contains__(self, value):
+        return self.find(value) >= 0
+
+    def entry_text(self, index):
+        return bytes(self.text[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+    def entry_regions(self, index):
+        """Region indexes of an entry, or None if it is shared by all."""
+        return bitmask_regions(self.regions[index])
+
+    def in_region(self, index, region):
+        """Whether an entry is shared or scoped to region (colour-only ones are neither)."""
+        if self.flags[index] & DB_COLOR_ONLY:
+            return False
+        mask = self.regions[index:index + 1]
+        if region is None:
+            return bool(self.shared(mask)[0])
+        return bool(has_region(mask, region)[0])
+
+    @staticmethod
+    def shared(masks):
+        """Which rows of a region bitmask array are shared entries."""
+        return (masks == ALL_REGIONS).all(axis=1)
+
+    def showable(self, region, skip=()):
+        """Mask of the entries with text that a region can show, except skip (indexes).
+
+        With region None, only the shared entries.
+        """
+        visible = self.shared(self.regions) if region is None else has_region(self.regions, region)
+        keep = visible & ((self.flags & DB_COLOR_ONLY) == 0) & (np.diff(self.offsets) > 0)
+        keep[list(skip)] = False
+        return keep
+
+    def region_keys(self, region, skip=()):
+        """Hash values of the entries with text that a region can show, except skip (indexes)."""
+        return self.keys[self.showable(region, skip)]
+
+    def capture_positions(self, mask):
+        """Capture-order positions of the entries in mask, ascending, leaving out aliases."""
+        return np.flatnonzero((mask & ((self.flags & DB_ALIAS) == 0))[self.order]).astype(np.uint32)
+
+    def position(self, index):
+        """Capture-order position of an entry."""
+        if self._positions is None:
+            positions = np.empty(len(self.order), dtype=np.uint32)
+            positions[self.order] = np.arange(len(self.order), dtype=np.uint32)
+            self._positions = positions
+        return int(self._positions[index])
+
+    def find_text(self, text):
+        """Indexes of the entries whose stripped text is exactly text.
+
+        Searches the raw text table rather than decoding every entry, so it is
+        cheap for rare strings such as the CG markers.
+        """
+        needle = text.encode("utf-8")
+        start = self._text_start
+        end = start + len(self.text)
+        found = []
+        position = self._buffer.find(needle, start, end) if needle else -1
+        while position >= 0:
+            index = int(np.searchsorted(self.offsets, position - start, side="right")) - 1
+            if (not self.flags[index] & DB_COLOR_ONLY and self.entry_text(index).strip() == text
+                    and index not in found):
+                found.append(index)
+            position = self._buffer.find(needle, position + 1, end)
+        return found
+
+    def color(self, value):
+        """Colour override of an integer hash as an (r, g, b, a) tuple, or None."""
+        index = self.find(value)
+        return None if index < 0 else self.entry_color(index)
+
+    def entry_color(self, index):
+        """Colour override of an entry as an (r, g, b, a) tuple, or None."""
+        if not self.flags[index] & DB_HAS_COLOR:
+            return None
+        color = QColor.fromRgba(int(self.colors[index]))
+        return color.red(), color.green(), color.blue(), color.alpha()
+
+    def to_json(self):
+        """Decompile into (database, hash colour overrides) in the JSON formats."""
+        db = {}
+        key = None
+        for index in self.order.tolist():
+            flags = self.flags[index]
+            if flags & DB_COLOR_ONLY:
+                continue
+            if flags & DB_ALIAS:
+                entry = db[key]
+                if isinstance(entry, str):
+                    entry = db[key] = {"text": entry}
+                entry.setdefault("aliases", []).append(hash_to_key(self.keys[index]))
+                continue
+            key = hash_to_key(self.keys[index])
+            text, regions = self.entry_text(index), self.entry_regions(index)
+            db[key] = text if regions is None else {"text": text, "regions": regions}
+        overrides = {}  # keys are sorted, so these come out in key order
+        for index in np.flatnonzero(self.flags & DB_HAS_COLOR).tolist():
+            if not self.flags[index] & DB_ALIAS:
+                r, g, b, a = self.entry_color(index)
+                overrides[hash_to_key(self.keys[index])] = (
+                    f"#{r:02X}{g:02X}{b:02X}" if a == 255 else [r, g, b, a]
+                )
+        return db, overrides
+
+
+# HASHING
+#
+# BatchHasher reproduces imagehash.phash bit for bit (PIL's integer grayscale,
+# PIL's fixed-point Lanczos resize, scipy's DCT, median threshold) but converts
+# the frame to grayscale once and runs a single DCT over every crop at once.
+# It never calls normalize_image, so it refuses to start once that does work
+# (rehash goes through get_perceptual_hash and would key the database apart).
+
+PHASH_SIZE = 8
+PHASH_IMG_SIZE = PHASH_SIZE * 4
+RESAMPLE_PRECISION_BITS = 32 - 8 - 2  # Pillow's 8bpc resample precision
+
+
+def _lanczos(x):
+    """Pillow's lanczos_filter (a=3)."""
+    if -3.0 <= x < 3.0:
+        return _sinc(x) * _sinc(x / 3)
+    return 0.0
+
+
+def _sinc(x):
+    if x == 0.0:
+        return 1.0
+    x = x * math.pi
+    return math.sin(x) / x
+
+
+def resample_matrix(in_size, out_size):
+    """Pillow's fixed-point Lanczos coefficients as an (out_size, in_size) matrix.
+
+    Entries are the integer weights Pillow uses, stored as float64 so the
+    resize can go through BLAS while staying exact.
+    """
+    matrix = np.zeros((out_size, in_size))
+    if in_size == out_size:
+        # Pillow skips the pass entirely
+        np.fill_diagonal(matrix, 1 << RESAMPLE_PRECISION_BITS)
+        return matrix
+
+    scale = filterscale = in_size / out_size
+    if filterscale < 1.0:
+        filterscale = 1.0
+    support = 3.0 * filterscale
+    ss = 1.0 / filterscale
+
+    for xx in range(out_size):
+        center = (xx + 0.5) * scale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size) - xmin
+        weights = [_lanczos((x + xmin - center + 0.5) * ss) for x in range(xmax)]
+        total = 0.0
+        for w in weights:
+            total += w
+        for x, w in enumerate(weights):
+            if total != 0.0:
+                w /= total
+            if w < 0:
+                matrix[xx, xmin + x] = int(-0.5 + w * (1 << RESAMPLE_PRECISION_BITS))
+            else:
+                matrix[xx, xmin + x] = int(0.5 + w * (1 << RESAMPLE_PRECISION_BITS))
+    return matrix
+
+
+def _clip8(acc):
+    """Round and clamp a fixed-point accumulator the way Pillow's clip8 does."""
+    acc += 1 << (RESAMPLE_PRECISION_BITS - 1)
+    acc *= 1.0 / (1 << RESAMPLE_PRECISION_BITS)  # exact: power-of-two scaling
+    np.floor(acc, out=acc)
+    return np.clip(acc, 0, 255, out=acc)
+
+
+def to_gray(frame):
+    """Grayscale uint8 array using PIL's integer ITU-R 601-2 luma."""
+    if isinstance(frame, Image.Image):
+        return np.asarray(frame.convert("L"))
+    if frame.ndim == 2:
+        return frame
+    rgb = frame[..., :3].astype(np.uint32)
+    luma = rgb[..., 0] * 19595 + rgb[..., 1] * 38470 + rgb[..., 2] * 7471 + 0x8000
+    return (luma >> 16).astype(np.uint8)
+
+
+def hash_to_key(value):
+    """Database key for a 64-bit hash, same as str(imagehash.phash(...))."""
+    return f"{int(value):016x}"
+
+
+class BatchHasher:
+    """Perceptual-hash many crops of one frame in a single pass."""
+
+    def __init__(self):
+        import scipy.fftpack  # slowest import at startup, so deferred to here
+
+        probe = Image.new("RGB", (1, 1))
+        if normalize_image(probe) is not probe:
+            raise RuntimeError("BatchHasher does not apply normalize_image; "
+                               "teach hash_rects the same normalization first")
+        self._dct = scipy.fftpack.dct
+        self._matrices = {}
+        self._scratch = {}
+
+    def _matrices_for(self, w, h):
+        key = (w, h)
+        if key not in self._matrices:
+            self._matrices[key] = (
+                resample_matrix(w, PHASH_IMG_SIZE).T.copy(),
+                resample_matrix(h, PHASH_IMG_SIZE),
+            )
+        return self._matrices[key]
+
+    def _scratch_for(self, w, h):
+        """Reused float buffers for one crop size: the crop and its resized rows."""
+        key = (w, h)
+        if key not in self._scratch:
+            self._scratch[key] = (np.empty((h, w)), np.empty((h, PHASH_IMG_SIZE)))
+        return self._scratch[key]
+
+    def hash_rects(self, frame, rects):
+        """Return a uint64 array with the pHash of each (x, y, w, h) crop of frame."""
+        if not rects:
+            return np.zeros(0, dtype=np.uint64)
+
+        gray = to_gray(frame)
+        stack = np.empty((len(rects), PHASH_IMG_SIZE, PHASH_IMG_SIZE))
+        for i, (x, y, w, h) in enumerate(rects):
+            horizontal, vertical = self._matrices_for(w, h)
+            crop, rows = self._scratch_for(w, h)
+            np.copyto(crop, gray[y:y + h, x:x + w])  # the crop itself is a view
+            _clip8(np.matmul(crop, horizontal, out=rows))
+            _clip8(np.matmul(vertical, rows, out=stack[i]))
+
+        dct = self._dct(self._dct(stack, axis=1), axis=2)
+        low = dct[:, :PHASH_SIZE, :PHASH_SIZE].reshape(len(rects), -1)
+        bits = low > np.median(low, axis=1, keepdims=True)
+        return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+# MATCHING
+
+HASH_BITS = 64
+INDEX_CHUNKS = 4
+INDEX_CHUNK_BITS = HASH_BITS // INDEX_CHUNKS
+
+
+def hamming(a, b):
+    """Number of differing bits between two integer hashes."""
+    return bin(a ^ b).count("1")
+
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+PAIR_BLOCK = 1 << 22  # XOR results held at once by close_pairs (32 MB)
+
+
+def popcount64(values, out=None):
+    """Number of set bits in each element of a uint64 array, as uint8."""
+    if hasattr(np, "bitwise_count"):  # NumPy 2.0+
+        return np.bitwise_count(values, out=out)
+    counts = _POPCOUNT8[values.view(np.uint8).reshape(values.shape + (8,))]
+    return counts.sum(axis=-1, dtype=np.uint8, out=out)
+
+
+def close_pairs(values, max_distance):
+    """Every pair i < j of a uint64 array at most max_distance bits apart.
+
+    Brute force, a block of rows against everything after it at a time, so
+    it is all vectorized XOR and popcount with memory capped by PAIR_BLOCK.
+    Returns (i, j, distance) arrays.
+    """
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    n = len(values)
+    rows = max(1, PAIR_BLOCK // max(n, 1))
+    xor = np.empty(rows * n, dtype=np.uint64)
+    bits = np.empty(rows * n, dtype=np.uint8)
+    close = np.empty(rows * n, dtype=bool)
+    found = []
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
+        rest = values[start:]
+        size = (stop - start) * len(rest)
+        np.bitwise_xor(values[start:stop, None], rest[None, :],
+                       out=xor[:size].reshape(stop - start, len(rest)))
+        popcount64(xor[:size], out=bits[:size])
+        np.less_equal(bits[:size], max_distance, out=close[:size])
+        hits = np.flatnonzero(close[:size])  # far faster than a 2-D nonzero
+        i, j = np.divmod(hits, len(rest))
+        keep = j > i  # the block's own diagonal and below are pairs seen already
+        found.append((i[keep] + start, j[keep] + start, bits[hits[keep]]))
+    if not found:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, np.zeros(0, dtype=np.uint8)
+    return tuple(np.concatenate(parts) for parts in zip(*found))
+
+
+class HashIndex:
+    """Multi-index hashing over 64-bit keys for tolerant lookups.
+
+    Keys are split into four 16-bit chunks with one table per chunk. Any key
+    within distance k of the query agrees with it to within k // 4 bits on at
+    least one chunk, so only those chunk neighbours need probing: k <= 3 is four
+    dict lookups, k <= 7 is 68, however big the database gets.
+    """
+
+    def __init__(self, keys=()):
+        self.tables = [{} for _ in range(INDEX_CHUNKS)]
+        self.keys = set()
+        self._flips = {}
+        for key in keys:
+            self.add(key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    @staticmethod
+    def _chunks(key):
+        mask = (1 << INDEX_CHUNK_BITS) - 1
+        return [(key >> (i * INDEX_CHUNK_BITS)) & mask for i in range(INDEX_CHUNKS)]
+
+    def _flip_masks(self, radius):
+        """Every chunk-sized mask with at most radius bits set."""
+        if radius not in self._flips:
+            masks = []
+            for bits in range(radius + 1):
+                for combo in itertools.combinations(range(INDEX_CHUNK_BITS), bits):
+                    masks.append(sum(1 << b for b in combo))
+            self._flips[radius] = masks
+        return self._flips[radius]
+
+    def add(self, key):
+        if key in self.keys:
+            return
+        self.keys.add(key)
+        for table, chunk in zip(self.tables, self._chunks(key)):
+            table.setdefault(chunk, []).append(key)
+
+    def nearest(self, key, max_distance=0):
+        """Closest indexed key within max_distance bits as (key, distance), or None."""
+        if key in self.keys:
+            return key, 0
+        if max_distance <= 0:
+            return None
+
+        best = None
+        masks = self._flip_masks(max_distance // INDEX_CHUNKS)
+        for table, chunk in zip(self.tables, self._chunks(key)):
+            for mask in masks:
+                for candidate in table.get(chunk ^ mask, ()):
+                    distance = hamming(candidate, key)
+                    if distance <= max_distance and (best is None or (distance, candidate) < best):
+                        best = (distance, candidate)
+        return None if best is None else (best[1], best[0])
+
+
 def create_qcolor(color, default=(255, 255, 255)):
     """Create QColor from various input formats."""
     if color is None:
@@ -113,6 +769,896 @@ def create_qcolor(color, default=(255, 255, 255)):
     return QColor(color) if isinstance(color, str) else QColor(*color)
 
 
+# CAPTURE
+
+def flatten_rect(value):
+    """Return an (x, y, w, h) tuple, unwrapping the [[x, y, w, h]] form."""
+    if (isinstance(value, (list, tuple)) and len(value) == 1 and
+            isinstance(value[0], (list, tuple))):
+        value = value[0]
+    return tuple(int(v) for v in value)
+
+
+def union_rect(rects):
+    """Bounding (x, y, w, h) of a list of rects."""
+    left = min(x for x, y, w, h in rects)
+    top = min(y for x, y, w, h in rects)
+    right = max(x + w for x, y, w, h in rects)
+    bottom = max(y + h for x, y, w, h in rects)
+    return (left, top, right - left, bottom - top)
+
+
+def rebase_rect(rect, origin):
+    """Move a screen rect into the coordinate space of a capture at origin."""
+    x, y, w, h = rect
+    ox, oy = origin
+    return (x - ox, y - oy, w, h)
+
+
+def compute_capture_rect(region_cfg, cg_cfg, native_cfg=None, scene_cfg=()):
+    """Smallest screen rect containing every region crop, the CG crops and scene anchors.
+
+    In native DS mode that is the emulator's screens instead.
+    """
+    if native_cfg:
+        return union_rect([flatten_rect(rect) for rect in native_cfg["screens"].values()])
+    rects = [flatten_rect(region["crop"]) for region in region_cfg]
+    rects += [flatten_rect(cg_cfg[key]) for key in ("trigger_crop", "stop_crop")]
+    rects += [flatten_rect(anchor["crop"]) for scene in scene_cfg for anchor in scene.get("anchors", [])]
+    return union_rect(rects)
+
+
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [
+        ("biSize", wintypes.DWORD), ("biWidth", wintypes.LONG),
+        ("biHeight", wintypes.LONG), ("biPlanes", wintypes.WORD),
+        ("biBitCount", wintypes.WORD), ("biCompression", wintypes.DWORD),
+        ("biSizeImage", wintypes.DWORD), ("biXPelsPerMeter", wintypes.LONG),
+        ("biYPelsPerMeter", wintypes.LONG), ("biClrUsed", wintypes.DWORD),
+        ("biClrImportant", wintypes.DWORD),
+    ]
+
+
+class FrameBuffer:
+    """Preallocated BGRX frames and grayscale planes, handed out in turn.
+
+    With two slots, the frame returned by one grab stays untouched until the
+    grab after next, so nothing still reading the previous frame sees it
+    overwritten. Nothing is allocated per frame.
+    """
+
+    def __init__(self, width, height, slots=2):
+        self.frames = [np.zeros((height, width, 4), dtype=np.uint8) for _ in range(slots)]
+        self.grays = [np.zeros((height, width), dtype=np.uint8) for _ in range(slots)]
+        self._luma = np.zeros((height, width), dtype=np.uint32)
+        self._channel = np.zeros((height, width), dtype=np.uint32)
+        self.index = 0
+
+    def next(self):
+        """The next (frame, gray) pair to fill."""
+        self.index = (self.index + 1) % len(self.frames)
+        return self.frames[self.index], self.grays[self.index]
+
+    def to_gray(self, frame, gray):
+        """Write PIL's integer luma of a BGRX frame into gray, in place.
+
+        Works on whole BGRX pixels as uint32 words, which beats strided
+        per-channel passes.
+        """
+        pixels = frame.view(np.uint32)[..., 0]
+        luma, channel = self._luma, self._channel
+        np.bitwise_and(pixels, 0xFF, out=luma)
+        luma *= 7471
+        for shift, weight in ((8, 38470), (16, 19595)):
+            np.right_shift(pixels, shift, out=channel)
+            channel &= 0xFF
+            channel *= weight
+            luma += channel
+        luma += 0x8000
+        luma >>= 16
+        np.copyto(gray, luma, casting="unsafe")
+        return gray
+
+
+class CaptureBackend:
+    """One way of grabbing a fixed screen rect, as a PIL image or into a BGRX array."""
+
+    name = None
+
+    def __init__(self, rect):
+        self.rect = rect
+
+    @classmethod
+    def available(cls):
+        """Whether this backend can work on this machine at all."""
+        return True
+
+    def grab(self):
+        """Capture the rect as an RGB PIL image."""
+        raise NotImplementedError
+
+    def grab_into(self, frame):
+        """Capture the rect into a preallocated (h, w, 4) BGRX array."""
+        frame[..., 2::-1] = np.asarray(self.grab())
+
+    def close(self):
+        pass
+
+
+class GdiCapture(CaptureBackend):
+    """BitBlt a fixed rect off the Windows desktop, reusing the same DC and bitmap."""
+
+    name = "gdi"
+    SRCCOPY = 0x00CC0020
+    DIB_RGB_COLORS = 0
+
+    @classmethod
+    def available(cls):
+        return sys.platform.startswith("win")
+
+    def __init__(self, rect):
+        super().__init__(rect)
+        x, y, w, h = rect
+        self.user32 = ctypes.windll.user32
+        self.gdi32 = ctypes.windll.gdi32
+        self.user32.GetDC.restype = wintypes.HDC
+        self.gdi32.CreateCompatibleDC.restype = wintypes.HDC
+        self.gdi32.CreateCompatibleBitmap.restype = wintypes.HBITMAP
+        self.gdi32.SelectObject.restype = wintypes.HGDIOBJ
+        self.gdi32.SelectObject.argtypes = [wintypes.HDC, wintypes.HGDIOBJ]
+        self.gdi32.DeleteObject.argtypes = [wintypes.HGDIOBJ]
+        self.gdi32.DeleteDC.argtypes = [wintypes.HDC]
+        self.user32.ReleaseDC.argtypes = [wintypes.HWND, wintypes.HDC]
+
+        self.screen_dc = self.user32.GetDC(None)
+        self.mem_dc = self.gdi32.CreateCompatibleDC(self.screen_dc)
+        self.bitmap = self.gdi32.CreateCompatibleBitmap(self.screen_dc, w, h)
+        self.previous = self.gdi32.SelectObject(self.mem_dc, self.bitmap)
+
+        self.header = BITMAPINFOHEADER()
+        self.header.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+        self.header.biWidth = w
+        self.header.biHeight = -h  # top-down rows
+        self.header.biPlanes = 1
+        self.header.biBitCount = 32
+        self.buffer = ctypes.create_string_buffer(w * h * 4)
+
+    def grab(self):
+        """Copy the rect and return it as an RGB PIL image."""
+        x, y, w, h = self.rect
+        self.gdi32.BitBlt(self.mem_dc, 0, 0, w, h, self.screen_dc, x, y, self.SRCCOPY)
+        self.gdi32.GetDIBits(
+            self.mem_dc, self.bitmap, 0, h, self.buffer,
+            ctypes.byref(self.header), self.DIB_RGB_COLORS
+        )
+        return Image.frombuffer("RGB", (w, h), self.buffer, "raw", "BGRX", 0, 1).copy()
+
+    def grab_into(self, frame):
+        """Copy the rect straight into frame; GetDIBits writes BGRX rows."""
+        x, y, w, h = self.rect
+        self.gdi32.BitBlt(self.mem_dc, 0, 0, w, h, self.screen_dc, x, y, self.SRCCOPY)
+        self.gdi32.GetDIBits(
+            self.mem_dc, self.bitmap, 0, h, frame.ctypes.data_as(ctypes.c_void_p),
+            ctypes.byref(self.header), self.DIB_RGB_COLORS
+        )
+
+    def close(self):
+        """Release the GDI objects."""
+        self.gdi32.SelectObject(self.mem_dc, self.previous)
+        self.gdi32.DeleteObject(self.bitmap)
+        self.gdi32.DeleteDC(self.mem_dc)
+        self.user32.ReleaseDC(None, self.screen_dc)
+
+
+class MssCapture(CaptureBackend):
+    """Grab through the mss package (GDI on Windows, XGetImage on X11)."""
+
+    name = "mss"
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec("mss") is not None
+
+    def __init__(self, rect):
+        super().__init__(rect)
+        import mss  # optional dependency
+
+        x, y, w, h = rect
+        self.sct = mss.mss()
+        self.monitor = {"left": x, "top": y, "width": w, "height": h}
+
+    def grab(self):
+        shot = self.sct.grab(self.monitor)
+        return Image.frombuffer("RGB", shot.size, shot.bgra, "raw", "BGRX", 0, 1).copy()
+
+    def grab_into(self, frame):
+        shot = self.sct.grab(self.monitor)
+        np.copyto(frame, np.frombuffer(shot.raw, dtype=np.uint8).reshape(frame.shape))
+
+    def close(self):
+        self.sct.close()
+
+
+class XImage(ctypes.Structure):
+    # Leading fields of Xlib's XImage; only ever used through a pointer from Xlib
+    _fields_ = [
+        ("width", ctypes.c_int), ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int), ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p), ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int), ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int), ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int), ("bits_per_pixel", ctypes.c_int),
+    ]
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong), ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p), ("readOnly", ctypes.c_int),
+    ]
+
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int), ("display", ctypes.c_void_p),
+        ("resourceid", ctypes.c_ulong), ("serial", ctypes.c_ulong),
+        ("error_code", ctypes.c_ubyte), ("request_code", ctypes.c_ubyte),
+        ("minor_code", ctypes.c_ubyte),
+    ]
+
+
+X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XErrorEvent))
+
+
+class XShmCapture(CaptureBackend):
+    """Grab from the X server into a shared memory segment (MIT-SHM), no copies over the socket.
+
+    X errors are trapped around every request that can fail, since Xlib's
+    default handler would exit the process, and raised as OSError instead.
+    """
+
+    name = "xshm"
+    ZPIXMAP = 2
+    IPC_PRIVATE = 0
+    IPC_CREAT = 0o1000
+    IPC_RMID = 0
+    ALL_PLANES = (1 << (8 * ctypes.sizeof(ctypes.c_ulong))) - 1
+
+    @classmethod
+    def available(cls):
+        return (sys.platform.startswith("linux") and bool(os.environ.get("DISPLAY"))
+                and ctypes.util.find_library("Xext") is not None)
+
+    def __init__(self, rect):
+        super().__init__(rect)
+        x, y, w, h = rect
+        x11 = self.x11 = ctypes.CDLL(ctypes.util.find_library("X11"))
+        xext = self.xext = ctypes.CDLL(ctypes.util.find_library("Xext"))
+        libc = self.libc = ctypes.CDLL(None, use_errno=True)
+
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+        x11.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+            ctypes.POINTER(XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint,
+        ]
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage),
+            ctypes.c_int, ctypes.c_int, ctypes.c_ulong,
+        ]
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+        self.display = x11.XOpenDisplay(None)
+        if not self.display:
+            raise OSError("Cannot open X display")
+        if not xext.XShmQueryExtension(self.display):
+            x11.XCloseDisplay(self.display)
+            raise OSError("X server has no MIT-SHM extension")
+        screen = x11.XDefaultScreen(self.display)
+        self.root = x11.XDefaultRootWindow(self.display)
+
+        self.shminfo = XShmSegmentInfo()
+        self.image = xext.XShmCreateImage(
+            self.display, x11.XDefaultVisual(self.display, screen),
+            x11.XDefaultDepth(self.display, screen), self.ZPIXMAP, None,
+            ctypes.byref(self.shminfo), w, h,
+        )
+        if not self.image or self.image.contents.bits_per_pixel != 32:
+            x11.XCloseDisplay(self.display)
+            raise OSError("Only 32 bits per pixel X screens are supported")
+        self.size = self.image.contents.bytes_per_line * h
+
+        self._x_errors = []
+        self._x_handler = X_ERROR_HANDLER(self._on_x_error)
+
+        self.shminfo.shmid = libc.shmget(self.IPC_PRIVATE, self.size, self.IPC_CREAT | 0o600)
+        if self.shminfo.shmid < 0:
+            x11.XCloseDisplay(self.display)
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        address = libc.shmat(self.shminfo.shmid, None, 0)
+        if address is None or address == ctypes.c_void_p(-1).value:
+            error = ctypes.get_errno()
+            libc.shmctl(self.shminfo.shmid, self.IPC_RMID, None)
+            x11.XCloseDisplay(self.display)
+            raise OSError(error, "shmat failed")
+        self.shminfo.shmaddr = self.image.contents.data = address
+        self.shminfo.readOnly = 0
+        try:
+            self._checked("XShmAttach", lambda: xext.XShmAttach(self.display, ctypes.byref(self.shminfo)),
+                          sync=True)
+        except OSError:
+            libc.shmdt(ctypes.c_void_p(address))
+            libc.shmctl(self.shminfo.shmid, self.IPC_RMID, None)
+            x11.XCloseDisplay(self.display)
+            raise
+        # Marked for removal now, freed by the kernel once both sides detach
+        libc.shmctl(self.shminfo.shmid, self.IPC_RMID, None)
+        self.buffer = (ctypes.c_char * self.size).from_address(self.shminfo.shmaddr)
+        self.stride = self.image.contents.bytes_per_line
+        self.view = np.ndarray((h, w, 4), np.uint8, self.buffer, strides=(self.stride, 4, 1))
+
+    def _on_x_error(self, display, event):
+        self._x_errors.append(event.contents.error_code)
+        return 0
+
+    def _checked(self, what, request, sync=False):
+        """Run an Xlib request with X errors trapped; raise OSError if it fails."""
+        self._x_errors.clear()
+        previous = self.x11.XSetErrorHandler(ctypes.cast(self._x_handler, ctypes.c_void_p))
+        try:
+            status = request()
+            if sync:
+                self.x11.XSync(self.display, 0)
+        finally:
+            self.x11.XSetErrorHandler(previous)
+        if self._x_errors:
+            raise OSError(f"{what} failed with X error {self._x_errors[0]}")
+        if not status:
+            raise OSError(f"{what} failed")
+
+    def _get_image(self):
+        x, y, w, h = self.rect
+        # Replies are waited for, so any error has arrived by the time it returns
+        self._checked("XShmGetImage", lambda: self.xext.XShmGetImage(
+            self.display, self.root, self.image, x, y, self.ALL_PLANES))
+
+    def grab(self):
+        x, y, w, h = self.rect
+        self._get_image()
+        return Image.frombuffer("RGB", (w, h), self.buffer, "raw", "BGRX", self.stride, 1).copy()
+
+    def grab_into(self, frame):
+        self._get_image()
+        np.copyto(frame, self.view)
+
+    def close(self):
+        try:
+            self._checked("XShmDetach", lambda: self.xext.XShmDetach(self.display, ctypes.byref(self.shminfo)),
+                          sync=True)
+        except OSError:
+            pass  # the segment is freed when the display closes anyway
+        self.libc.shmdt(ctypes.c_void_p(self.shminfo.shmaddr))
+        self.x11.XCloseDisplay(self.display)
+
+
+class PyAutoGuiCapture(CaptureBackend):
+    """pyautogui.screenshot, the original path; slow but works nearly everywhere."""
+
+    name = "pyautogui"
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec("pyautogui") is not None
+
+    def grab(self):
+        import pyautogui  # needs a display, so only pulled in when capturing
+        return pyautogui.screenshot(region=self.rect)
+
+
+def load_frames(path, lazy=False):
+    """Return a list-like of PIL images from a PNG directory, .npy pack, video or one PNG.
+
+    PNG directories are decoded up front unless lazy is set; videos are
+    always read on demand.
+    """
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(".png"))
+        files = ImageFiles([os.path.join(path, n) for n in names])
+        return files if lazy else [files[i] for i in range(len(files))]
+    if path.endswith(".npy"):
+        return PackedFrames(np.load(path, mmap_mode="r"))
+    if path.lower().endswith(".png"):
+        return ImageFiles([path])
+    if os.path.isfile(path):
+        return VideoFrames(path)
+    raise ValueError(f"Unsupported frame source: {path}")
+
+
+class ImageFiles:
+    """Lazy view over a list of image files."""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        with Image.open(self.paths[index]) as image:
+            return image.convert("RGB")
+
+
+class VideoFrames:
+    """Lazy view over the frames of a video file (needs opencv-python)."""
+
+    def __init__(self, path):
+        import cv2  # optional, only needed for recorded video
+
+        self._cv2 = cv2
+        self.video = cv2.VideoCapture(path)
+        if not self.video.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        self.count = int(self.video.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._next = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        # Sequential reads are cheap and seeks are not, so short skips read through
+        skip = index - self._next
+        if skip < 0 or skip > 60:
+            self.video.set(self._cv2.CAP_PROP_POS_FRAMES, index)
+        else:
+            for _ in range(skip):
+                self.video.grab()
+        ok, frame = self.video.read()
+        if not ok:
+            raise IndexError(index)
+        self._next = index + 1
+        return Image.fromarray(frame[..., ::-1])
+
+
+class PackedFrames:
+    """Lazy view over a memory-mapped (frames, h, w, 3) array."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return Image.fromarray(self.array[index])
+
+
+class FileCapture(CaptureBackend):
+    """Hands out recorded frames in a loop instead of grabbing the screen.
+
+    Frames may be full desktop screenshots or already cut to the rect. Frames
+    converted for grab_into are kept in an LRU capped at FILE_CACHE_MB, so
+    short recordings replay without conversion cost and long ones stay bounded.
+    """
+
+    name = "file"
+
+    @classmethod
+    def available(cls):
+        return False  # needs a frame source, so never picked automatically
+
+    def __init__(self, rect, frames):
+        super().__init__(rect)
+        self.frames = load_frames(frames) if isinstance(frames, str) else frames
+        if not len(self.frames):
+            raise ValueError("No frames to replay")
+        self.index = 0
+        self.max_bytes = FILE_CACHE_MB * 1024 * 1024
+        self.bytes = 0
+        self._arrays = OrderedDict()
+
+    def _fit(self, frame):
+        """Cut a full-desktop frame down to the capture rect."""
+        x, y, w, h = self.rect
+        if frame.size == (w, h):
+            return frame
+        return frame.crop((x, y, x + w, y + h))
+
+    def grab(self):
+        """Return the next frame, already cut to the capture rect."""
+        index = self.index % len(self.frames)
+        self.index += 1
+        return self._fit(self.frames[index])
+
+    def grab_into(self, frame):
+        index = self.index % len(self.frames)
+        bgrx = self._arrays.get(index)
+        if bgrx is not None:
+            self.index += 1
+            self._arrays.move_to_end(index)
+        else:
+            bgrx = np.zeros(frame.shape, dtype=np.uint8)
+            bgrx[..., 2::-1] = np.asarray(self.grab())
+            self._arrays[index] = bgrx
+            self.bytes += bgrx.nbytes
+            while self.bytes > self.max_bytes and len(self._arrays) > 1:
+                _, evicted = self._arrays.popitem(last=False)
+                self.bytes -= evicted.nbytes
+        np.copyto(frame, bgrx)
+
+
+CAPTURE_BACKENDS = {
+    backend.name: backend
+    for backend in (GdiCapture, MssCapture, XShmCapture, PyAutoGuiCapture, FileCapture)
+}
+
+
+def benchmark_backends(rect, frames=CAPTURE_BENCH_FRAMES, names=None):
+    """Time every available backend on rect, fastest first.
+
+    Returns (results, backends): one dict per backend with fps and latency
+    percentiles (or the error it failed with), and the backends that worked,
+    still open, keyed by name.
+    """
+    results = []
+    backends = {}
+    frame = np.empty((rect[3], rect[2], 4), dtype=np.uint8)  # timed the way the worker grabs
+    for name in names or CAPTURE_BACKENDS:
+        backend_class = CAPTURE_BACKENDS[name]
+        if not backend_class.available():
+            continue
+        backend = None
+        try:
+            backend = backend_class(rect)
+            backend.grab_into(frame)  # first grab pays for lazy setup
+            samples = []
+            for _ in range(frames):
+                start = time.perf_counter()
+                backend.grab_into(frame)
+                samples.append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            results.append({"name": name, "error": f"{type(e).__name__}: {e}"})
+            if backend is not None:
+                backend.close()
+            continue
+        p50, p95 = np.percentile(samples, (50, 95)).tolist()
+        mean = sum(samples) / len(samples)
+        results.append({"name": name, "fps": 1000 / mean if mean else 0.0,
+                        "mean_ms": mean, "p50_ms": p50, "p95_ms": p95})
+        backends[name] = backend
+    results.sort(key=lambda r: ("error" in r, r.get("mean_ms", 0.0)))
+    return results, backends
+
+
+def format_benchmark(result):
+    """One line describing a benchmark_backends result."""
+    if "error" in result:
+        return f"Capture {result['name']}: unavailable ({result['error']})"
+    return (f"Capture {result['name']}: {result['fps']:.0f} fps, "
+            f"p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms")
+
+
+class ScreenCapture:
+    """Grabs only the part of the screen that the regions look at.
+
+    Crops handed to the controllers must go through ``map_crop``. The
+    backend is a CAPTURE_BACKEND-style name or a CaptureBackend instance;
+    with "auto" every available backend is timed and the fastest is kept
+    (the timings stay in ``benchmark``).
+    """
+
+    def __init__(self, rect, backend=CAPTURE_BACKEND):
+        self.rect = rect
+        self.origin = (rect[0], rect[1])
+        self.buffer = FrameBuffer(rect[2], rect[3])
+        self.benchmark = []
+        if isinstance(backend, CaptureBackend):
+            self.backend = backend
+        elif backend.startswith("file:"):
+            self.backend = FileCapture(rect, backend[len("file:"):])
+        elif backend != "auto":
+            self.backend = CAPTURE_BACKENDS[backend](rect)
+        else:
+            self.benchmark, backends = benchmark_backends(rect)
+            if not backends:
+                raise RuntimeError(f"No screen capture backend works here: {self.benchmark}")
+            self.backend = backends.pop(self.benchmark[0]["name"])
+            for other in backends.values():
+                other.close()
+
+    def grab(self):
+        """Capture the configured rect as a PIL image."""
+        return self.backend.grab()
+
+    def grab_frame(self):
+        """Capture into the next preallocated BGRX frame and return it."""
+        frame, _ = self.buffer.next()
+        self.backend.grab_into(frame)
+        return frame
+
+    def grab_gray(self):
+        """Capture into the next preallocated frame and return its grayscale plane.
+
+        Crops of the result are plain NumPy views; it stays valid until the
+        grab after next.
+        """
+        frame, gray = self.buffer.next()
+        self.backend.grab_into(frame)
+        return self.buffer.to_gray(frame, gray)
+
+    def map_crop(self, rect, ds_crop=None):
+        """Where a screen rect lands in the frames grab_gray returns."""
+        return rebase_rect(flatten_rect(rect), self.origin)
+
+    def close(self):
+        self.backend.close()
+
+
+class NativeCapture:
+    """Turns captures of the emulator's screens back into native DS frames.
+
+    melonDS's Software renderer scales each screen up with nearest neighbour,
+    so sampling the centre of every DS pixel recovers the native 256x192
+    image exactly. The screens are stacked top to bottom in one small frame,
+    and everything after the grab (grayscale, change detection, hashing)
+    works on that instead of on the full-resolution capture.
+    """
+
+    def __init__(self, capture, screens):
+        self.capture = capture
+        self.backend = capture.backend
+        self.benchmark = capture.benchmark
+        self.screens = {}  # name -> (screen rect, first row in the native frame)
+
+        # Flat index of the desktop pixel sampled for every native pixel
+        ds_w, ds_h = DS_SCREEN_SIZE
+        stride = capture.rect[2]
+        index = []
+        for number, (name, rect) in enumerate(screens.items()):
+            rect = flatten_rect(rect)
+            x, y, w, h = rebase_rect(rect, capture.origin)
+            self.screens[name] = (rect, number * ds_h)
+            cols = x + ((np.arange(ds_w) + 0.5) * w / ds_w).astype(np.intp)
+            rows = y + ((np.arange(ds_h) + 0.5) * h / ds_h).astype(np.intp)
+            index.append(rows[:, None] * stride + cols)
+        self.index = np.concatenate(index)
+        self.buffer = FrameBuffer(ds_w, ds_h * len(self.screens))
+
+    def grab(self):
+        """Capture the emulator's screens at desktop resolution as a PIL image."""
+        return self.capture.grab()
+
+    def grab_gray(self):
+        """Capture and return the grayscale native frame, valid until the grab after next."""
+        frame = self.capture.grab_frame()
+        native, gray = self.buffer.next()
+        np.take(frame.view(np.uint32).reshape(-1), self.index, out=native.view(np.uint32)[..., 0])
+        return self.buffer.to_gray(native, gray)
+
+    def map_crop(self, rect, ds_crop=None):
+        """Native-frame crop for a desktop rect, or for a [screen, x, y, w, h] ds_crop."""
+        if ds_crop is not None:
+            screen, x, y, w, h = ds_crop
+            if screen not in self.screens:
+                raise ValueError(f"ds_crop {ds_crop} names unknown screen {screen!r}")
+            return (int(x), int(y) + self.screens[screen][1], int(w), int(h))
+
+        x, y, w, h = flatten_rect(rect)
+        ds_w, ds_h = DS_SCREEN_SIZE
+        for (sx, sy, sw, sh), top in self.screens.values():
+            if sx <= x + w / 2 < sx + sw and sy <= y + h / 2 < sy + sh:
+                left = max(0, round((x - sx) * ds_w / sw))
+                right = min(ds_w, round((x + w - sx) * ds_w / sw))
+                upper = max(0, round((y - sy) * ds_h / sh))
+                lower = min(ds_h, round((y + h - sy) * ds_h / sh))
+                return (left, top + upper, right - left, lower - upper)
+        raise ValueError(f"Crop {rect} is not on any DS screen")
+
+    def close(self):
+        self.capture.close()
+
+
+# CHANGE DETECTION
+
+DIRTY_TILE = 16  # pixels, must be a multiple of 8
+
+
+class DirtyMap:
+    """Per-tile checksums of the grayscale frame, to skip crops that did not change.
+
+    Each tile is summed as uint64 words times fixed random odd weights (wrapping),
+    so any single changed word always changes the checksum.
+    """
+
+    def __init__(self, tile=DIRTY_TILE):
+        self.tile = tile
+        self.checksums = None
+        self.changed = None
+        self.checked = 0
+        self.skipped = 0
+        self._padded = None
+        self._product = None
+        self._weights = None
+
+    def invalidate(self):
+        """Treat every tile as changed on the next frame."""
+        self.checksums = None
+
+    def update(self, gray):
+        """Checksum a new grayscale frame and mark the tiles that changed."""
+        h, w = gray.shape
+        t = self.tile
+        if self._padded is None or self._padded.shape != (-(-h // t) * t, -(-w // t) * t):
+            self._padded = np.zeros((-(-h // t) * t, -(-w // t) * t), dtype=np.uint8)
+            rng = np.random.default_rng(0x57A2F4)
+            self._weights = rng.integers(0, 2**63, (t, t // 8), dtype=np.uint64) * 2 + 1
+            self.checksums = None
+
+        self._padded[:h, :w] = gray
+        rows, cols = self._padded.shape[0] // t, self._padded.shape[1] // t
+        words = self._padded.view(np.uint64).reshape(rows, t, cols, t // 8)
+        if self._product is None or self._product.shape != words.shape:
+            self._product = np.empty_like(words)
+        np.multiply(words, self._weights[:, None, :], out=self._product)
+        checksums = self._product.sum(axis=(1, 3), dtype=np.uint64)
+
+        if self.checksums is None:
+            self.changed = np.ones((rows, cols), dtype=bool)
+        else:
+            self.changed = checksums != self.checksums
+        self.checksums = checksums
+
+    def is_dirty(self, rect):
+        """True if any tile under rect changed, counting the answer for stats."""
+        x, y, w, h = rect
+        t = self.tile
+        dirty = bool(self.changed[y // t:(y + h - 1) // t + 1, x // t:(x + w - 1) // t + 1].any())
+        self.checked += 1
+        if not dirty:
+            self.skipped += 1
+        return dirty
+
+    def skip_rate(self):
+        """Fraction of crops skipped since the last reset_stats()."""
+        return self.skipped / self.checked if self.checked else 0.0
+
+    def reset_stats(self):
+        self.checked = 0
+        self.skipped = 0
+
+
+# RENDERING
+
+# Everything an overlay image depends on; doubles as the render cache key
+OverlaySpec = namedtuple(
+    "OverlaySpec", "text font_family font_pt width height holes bg_color ratio"
+)
+
+
+def make_overlay_spec(rect, text, font_family, font_pt, holes, bg_color, ratio):
+    """Build an OverlaySpec for an overlay at rect (holes in screen coordinates)."""
+    x, y, w, h = rect
+    holes = tuple((hx - x, hy - y, hw, hh) for hx, hy, hw, hh in holes)
+    if isinstance(bg_color, list):
+        bg_color = tuple(bg_color)
+    return OverlaySpec(text, font_family, font_pt, w, h, holes, bg_color, ratio)
+
+
+def render_overlay(spec):
+    """Render background, holes and text into a QImage (safe off the GUI thread)."""
+    image = QImage(
+        round(spec.width * spec.ratio), round(spec.height * spec.ratio),
+        QImage.Format_ARGB32_Premultiplied
+    )
+    image.setDevicePixelRatio(spec.ratio)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+
+    # Fill background
+    painter.fillRect(QRect(0, 0, spec.width, spec.height), create_qcolor(spec.bg_color))
+
+    # Create holes (transparent areas)
+    painter.setCompositionMode(QPainter.CompositionMode_Clear)
+    for hole in spec.holes:
+        painter.fillRect(QRect(*hole), QColor(0, 0, 0, 0))
+
+    # Draw text
+    painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+    if spec.text:
+        doc = QTextDocument()
+        font = QFont(spec.font_family)
+        font.setPixelSize(spec.font_pt)
+        font.setWeight(QFont.Normal)
+        doc.setDefaultFont(font)
+        doc.setDefaultStyleSheet("body { margin:0; padding:0; line-height:1; }")
+        doc.setTextWidth(spec.width - 16)
+        doc.setPlainText(spec.text)
+        doc.drawContents(painter)
+    painter.end()
+    return image
+
+
+class RenderCache:
+    """LRU cache of rendered overlay images, capped by memory."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, spec):
+        with self._lock:
+            return spec in self._images
+
+    def get(self, spec):
+        """Rendered image for spec, rendering it now on a miss."""
+        with self._lock:
+            image = self._images.get(spec)
+            if image is not None:
+                self._images.move_to_end(spec)
+                self.hits += 1
+                return image
+            self.misses += 1
+        return self.put(spec, render_overlay(spec))
+
+    def put(self, spec, image):
+        """Store an image, evicting the least recently used ones over the cap."""
+        with self._lock:
+            if spec in self._images:
+                return self._images[spec]
+            self._images[spec] = image
+            self.bytes += image.sizeInBytes()
+            while self.bytes > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self.bytes -= evicted.sizeInBytes()
+        return image
+
+
+RENDER_CACHE = RenderCache(RENDER_CACHE_MB * 1024 * 1024)
+
+
+class RenderPrefetcher:
+    """Background thread that pre-renders overlay images into RENDER_CACHE."""
+
+    def __init__(self, cache=RENDER_CACHE):
+        self.cache = cache
+        self.jobs = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def prefetch(self, specs):
+        for spec in specs:
+            self.jobs.put(spec)
+
+    def _run(self):
+        while True:
+            spec = self.jobs.get()
+            if spec not in self.cache:
+                self.cache.put(spec, render_overlay(spec))
+
+
 # OVERLAY
 
 class OverlayWindow(QWidget):
@@ -136,6 +1682,8 @@ class OverlayWindow(QWidget):
         self.font_family = font_family or NDS_FAMILY
         self.holes = holes or []
         self.bg_color = bg_color
+        self._cache = None
+        self._cache_key = None
 
         self.show()
         hide_from_capture(int(self.winId()))
@@ -145,39 +1693,32 @@ class OverlayWindow(QWidget):
         self.text = text
         self.update()
 
+    def set_bg_color(self, bg_color):
+        """Update the background color in place."""
+        self.bg_color = bg_color
+        self.update()
+
     def paintEvent(self, event):
-        """Custom paint event to render text with holes."""
+        """Blit the cached rendering, fetching a new one only when its inputs changed."""
+        start = time.perf_counter()
+        spec = self.spec()
+        if spec != self._cache_key:
+            self._cache = RENDER_CACHE.get(spec)
+            self._cache_key = spec
         painter = QPainter(self)
-        
-        # Fill background
-        painter.fillRect(self.rect(), create_qcolor(self.bg_color))
-        
-        # Create holes (transparent areas)
-        painter.setCompositionMode(QPainter.CompositionMode_Clear)
-        overlay_x, overlay_y = self.x(), self.y()
-        for hole_x, hole_y, hole_w, hole_h in self.holes:
-            painter.fillRect(QRect(hole_x - overlay_x, hole_y - overlay_y, hole_w, hole_h), 
-                           QColor(0, 0, 0, 0))
-        
-        # Draw text
-        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
-        if self.text:
-            self._draw_text(painter)
-
-    def _draw_text(self, painter):
-        """Draw formatted text on the overlay."""
-        doc = QTextDocument()
-        font = QFont(self.font_family)
-        font.setPixelSize(self.font_pt)
-        font.setWeight(QFont.Normal)
-        doc.setDefaultFont(font)
-        doc.setDefaultStyleSheet("body { margin:0; padding:0; line-height:1; }")
-        doc.setTextWidth(self.rect().width() - 16)
-        doc.setPlainText(self.text)
-        
-        painter.save()
-        doc.drawContents(painter)
-        painter.restore()
+        painter.drawImage(0, 0, self._cache)
+        painter.end()
+        end = time.perf_counter()
+        TICK_STATS.record("paint", end - start)
+        TRACER.span("paint", start, end, text=self.text[:40])
+
+    def spec(self):
+        """OverlaySpec for what this window currently shows."""
+        return make_overlay_spec(
+            (self.x(), self.y(), self.width(), self.height()), self.text,
+            self.font_family, self.font_pt, self.holes, self.bg_color,
+            self.devicePixelRatioF(),
+        )
 
 
 class PatchWindow(QWidget):
@@ -206,6 +1747,12 @@ class PatchWindow(QWidget):
             self.font_pt = spec.get("font_pt", 12)
             self.color = spec.get("color", (255, 255, 255))
 
+        # Built once instead of on every paint
+        self.qcolor = create_qcolor(self.color)
+        self.qfont = QFont(NDS_FAMILY)
+        self.qfont.setPixelSize(self.font_pt)
+        self.qfont.setWeight(QFont.Normal)
+
         self.setGeometry(*rect)
         self.show()
         hide_from_capture(int(self.winId()))
@@ -213,14 +1760,11 @@ class PatchWindow(QWidget):
     def paintEvent(self, event):
         """Paint the patch with optional text."""
         painter = QPainter(self)
-        painter.fillRect(self.rect(), create_qcolor(self.color))
+        painter.fillRect(self.rect(), self.qcolor)
         
         if self.text:
             painter.setPen(QColor(0, 0, 0))
-            font = QFont(NDS_FAMILY)
-            font.setPixelSize(self.font_pt)
-            font.setWeight(QFont.Normal)
-            painter.setFont(font)
+            painter.setFont(self.qfont)
             painter.drawText(self.rect(), Qt.AlignCenter, self.text)
 
 
@@ -264,13 +1808,20 @@ class VideoOverlay(QWidget):
 class RegionController:
     """Controller for managing translation overlays for specific screen regions."""
     
-    def __init__(self, config, app):
+    def __init__(self, config, app, region_index=None):
         self.config = config
         self.app = app
+        self.region_index = region_index
         self.overlay = None
         self.patches = []
         self.last_hash = None
         self._sanitize_config()
+        self.crop = self.config["crop"]
+        self.match_distance = int(self.config.get("match_distance", 0))
+        self.db = None
+        self.index = None
+        self._shared_ahead = self._own_ahead = np.zeros(0, dtype=np.uint32)
+        self.holes, self.block_patches = self._split_patches()
 
     def _sanitize_config(self):
         """Sanitize region configuration format."""
@@ -280,86 +1831,267 @@ class RegionController:
                 isinstance(value[0], (list, tuple))):
                 self.config[key] = tuple(value[0])
 
-    def destroy(self):
-        """Clean up all overlay windows."""
+    def rebase(self, capture):
+        """Point the crop at the frames capture hands out."""
+        self.crop = capture.map_crop(self.config["crop"], self.config.get("ds_crop"))
+
+    def hide(self):
+        """Hide the overlay windows but keep them around for the next match."""
         if self.overlay:
-            self.overlay.close()
+            self.overlay.hide()
         for patch in self.patches:
-            patch.close()
-        self.overlay = None
-        self.patches = []
+            patch.hide()
         self.last_hash = None
 
-    def update(self, screenshot, database):
-        """Update overlay based on current screenshot."""
+    def set_database(self, db, markers=(), shared_ahead=None):
+        """Look entries up in a CompiledDatabase.
+
+        Only a region with a match_distance gets a HashIndex (of the entries it
+        can show, without the CG markers), since exact matches are a binary
+        search of the database. For prefetching it keeps the capture-order
+        positions of its own scoped entries; those of the shared entries
+        (shared_ahead) are worked out once for every region.
+        """
+        self.db = db
+        self.index = None
+        if self.match_distance > 0:
+            self.index = HashIndex(db.region_keys(self.region_index, markers).tolist())
+        if shared_ahead is None:
+            shared_ahead = db.capture_positions(db.showable(None, markers))
+        self._shared_ahead = shared_ahead
+        own = db.showable(self.region_index, markers) & ~db.shared(db.regions)
+        self._own_ahead = db.capture_positions(own)
+
+    def _entry_text(self, index):
+        """Text of database entry index if this region can show it, or ""."""
+        if index < 0 or not self.db.in_region(index, self.region_index):
+            return ""
+        text = self.db.entry_text(index).strip()
+        return "" if text in CG_TAGS else text
+
+    def text(self, hash_value):
+        """Text of the entry for a hash if this region can show it, or ""."""
+        return self._entry_text(self.db.find(hash_value))
+
+    def background(self, hash_value):
+        """Overlay colour for an entry: its colour override, else the region's."""
+        color = self.db.color(hash_value)
+        return color if color is not None else self.config.get("overlay_color", (255, 255, 255))
+
+    def match(self, hash_value):
+        """Find the translation for a hash, tolerating match_distance flipped bits.
+
+        Returns (hash, text, note): the database hash that matched (which is what
+        gets shown and colour-overridden), its text, and a log note for near
+        matches. Only reads the table, so it is safe off the GUI thread.
+        """
+        translation_text = self.text(hash_value)
+        if translation_text or not self.index:
+            return hash_value, translation_text, ""
+
+        match = self.index.nearest(hash_value, self.match_distance)
+        if match is None:
+            return hash_value, "", ""
+        matched_value, distance = match
+        return matched_value, self.text(matched_value), f" (~{hash_to_key(hash_value)}, {distance} bits off)"
+
+    def update(self, match):
+        """Update overlay windows for a (hash, text, note) result from match()."""
         if not self.app.translation_enabled:
-            self.destroy()
+            self.hide()
             return
 
-        # Crop screenshot to region
-        x, y, w, h = self.config["crop"]
-        cropped_image = screenshot.crop((x, y, x + w, y + h))
-        
-        # Exact hash look-up
-        hash_key = str(get_perceptual_hash(cropped_image))
-        translation_text = database.get(hash_key, "").strip()
+        hash_value, translation_text, note = match
 
         if translation_text:
             # Decide the overlay background color
-            desired_color = HASH_COLOR_OVERRIDES.get(
-                hash_key, self.config.get("overlay_color", (255, 255, 255))
-            )
+            desired_color = self.background(hash_value)
 
             # Is this a brand-new hash?
-            new_hash = (hash_key != self.last_hash)
-
-            # Re-create overlay if it’s missing OR hash changed OR color changed
-            if (
-                not self.overlay
-                or desired_color != getattr(self.overlay, "bg_color", None)
-            ):
-                self.destroy()
+            new_hash = (hash_value != self.last_hash)
+
+            # Windows are created on first use, then recolored and re-shown in place
+            if not self.overlay:
                 self._create_overlay(desired_color)
+            elif desired_color != self.overlay.bg_color:
+                self.overlay.set_bg_color(desired_color)
+            if self.overlay.isHidden():
+                self.overlay.show()
+                for patch in self.patches:
+                    patch.show()
 
             # Make sure the text is up to date
             if new_hash or self.overlay.text != translation_text:
                 self.overlay.set_text(translation_text)
 
-            # Only log the first time you see a new hash
+            # Only log the first time you see a new hash, and render what usually follows it
             if new_hash:
-                self.app.log(f"Detected hash {hash_key}")
+                self.app.log(f"Detected hash {hash_to_key(hash_value)}{note}")
+                self.app.prefetcher.prefetch(self.upcoming_specs(hash_value))
 
             # Remember what it's showing
-            self.last_hash = hash_key
+            self.last_hash = hash_value
 
         else:
-            # No translation, nuke the overlay
-            self.destroy()
+            # No translation, hide the overlay until the next match
+            self.hide()
 
-
-
-    def _create_overlay(self, bg_color):
-        """Create the overlay window and patches."""
+    def _split_patches(self):
+        """Separate holes cut into the overlay from block patches drawn over the UI."""
         holes = []
         block_patches = []
-        
-        # Separate holes from block patches
         for spec in self.config.get("patches", []):
             if isinstance(spec, dict) and ("cut" in spec or "hole" in spec):
                 holes.append(spec.get("cut") or spec.get("hole"))
             else:
                 block_patches.append(spec)
-        
-        # Create main overlay
+        return holes, block_patches
+
+    def overlay_spec(self, hash_value, text, ratio):
+        """OverlaySpec the overlay window would render for this entry."""
+        return make_overlay_spec(
+            self.config["overlay"], text, NDS_FAMILY,
+            self.config.get("font_pt", 13), self.holes, self.background(hash_value), ratio,
+        )
+
+    def upcoming_specs(self, hash_value, count=PREFETCH_AHEAD):
+        """Specs for the entries captured right after hash_value.
+
+        The database is in capture order, so the entries that follow a line
+        are usually the next lines of the same scene. Entries scoped to other
+        regions and aliases (same text as their entry) are skipped.
+        """
+        index = self.db.find(hash_value)
+        if index < 0:
+            return []
+        position = self.db.position(index)
+        ahead = []
+        for positions in (self._shared_ahead, self._own_ahead):
+            start = int(np.searchsorted(positions, position, side="right"))
+            ahead += positions[start:start + count].tolist()
+        ratio = self.overlay.devicePixelRatioF() if self.overlay else 1.0
+        specs = []
+        for index in (int(self.db.order[p]) for p in sorted(ahead)[:count]):
+            text = self.db.entry_text(index).strip()
+            if text:
+                specs.append(self.overlay_spec(int(self.db.keys[index]), text, ratio))
+        return specs
+
+    def _create_overlay(self, bg_color):
+        """Create the overlay window and patches."""
         self.overlay = OverlayWindow(
             self.config["overlay"],
-            holes=holes,
+            holes=self.holes,
             bg_color=bg_color,
             font_pt=self.config.get("font_pt", 13),
         )
        
         # Create patch windows
-        self.patches = [PatchWindow(spec) for spec in block_patches]
+        self.patches = [PatchWindow(spec) for spec in self.block_patches]
+
+
+def priority_groups(controllers):
+    """Regions bundled into exclusive groups, each ordered highest priority first.
+
+    Regions sharing a "group" name in overlay_regions.json form one group,
+    ordered by "priority" (higher first, default 0, then config order).
+    Ungrouped regions are groups of one.
+    """
+    groups = {}
+    for controller in controllers:
+        name = controller.config.get("group")
+        groups.setdefault(controller if name is None else name, []).append(controller)
+    return [
+        sorted(group, key=lambda c: -int(c.config.get("priority", 0)))
+        for group in groups.values()
+    ]
+
+
+class SceneTracker:
+    """Works out which screen the game is showing from a few anchor crops.
+
+    Scenes come from the "scenes" list in overlay_regions.json, first match
+    winning:
+        {"name": "pause", "regions": [12, 13, 14],
+         "anchors": [{"crop": [x, y, w, h], "hashes": ["..."], "match_distance": 0}]}
+    Only the recognized scene's regions are looked at. A scene without
+    anchors is the fallback while no other scene is recognized; with no
+    fallback (or no scenes at all) every region stays active.
+    """
+
+    def __init__(self, scene_cfg, controllers):
+        self.scenes = []  # (name, anchor indexes, controllers)
+        self.anchors = []  # {"config", "crop", "values", "distance"}
+        self.fallback = None
+        for scene in scene_cfg:
+            regions = scene.get("regions", [])
+            unknown = [index for index in regions if not 0 <= index < len(controllers)]
+            if unknown:
+                raise ValueError(
+                    f"Scene {scene.get('name')!r} lists regions {unknown}, "
+                    f"but only {len(controllers)} are configured"
+                )
+            members = [controllers[index] for index in regions]
+            indexes = []
+            for anchor in scene.get("anchors", []):
+                indexes.append(len(self.anchors))
+                self.anchors.append({
+                    "config": anchor,
+                    "crop": flatten_rect(anchor["crop"]),
+                    "values": [int(key, 16) for key in anchor.get("hashes", [])],
+                    "distance": int(anchor.get("match_distance", 0)),
+                })
+            if indexes:
+                self.scenes.append((scene["name"], indexes, members))
+            elif self.fallback is None:
+                self.fallback = (scene["name"], [], members)
+        self.seen = [False] * len(self.anchors)
+        self.all_groups = priority_groups(controllers)
+        self.current = None
+        self.active = set(controllers)
+        self.groups = self.all_groups
+        self._select(self.fallback)
+
+    def rebase(self, capture):
+        """Point the anchor crops at the frames capture hands out."""
+        for anchor in self.anchors:
+            anchor["crop"] = capture.map_crop(anchor["config"]["crop"], anchor["config"].get("ds_crop"))
+
+    def dirty_anchors(self, dirty_map):
+        """Indexes of the anchors whose crops changed since the last frame."""
+        return [i for i, anchor in enumerate(self.anchors) if dirty_map.is_dirty(anchor["crop"])]
+
+    def update(self, indexes, values):
+        """Take fresh anchor hashes; returns (regions left, regions entered) on a scene change."""
+        for index, value in zip(indexes, values):
+            anchor = self.anchors[index]
+            self.seen[index] = any(
+                hamming(value, known) <= anchor["distance"] for known in anchor["values"]
+            )
+        scene = next(
+            (scene for scene in self.scenes if any(self.seen[i] for i in scene[1])), self.fallback
+        )
+        if scene is self.current:
+            return set(), set()
+        before = self.active
+        self._select(scene)
+        return before - self.active, self.active - before
+
+    def _select(self, scene):
+        self.current = scene
+        if scene is None:
+            self.active = {c for group in self.all_groups for c in group}
+            self.groups = self.all_groups
+        else:
+            self.active = set(scene[2])
+            self.groups = [
+                members for members in ([c for c in g if c in self.active] for g in self.all_groups)
+                if members
+            ]
+
+    @property
+    def name(self):
+        return self.current[0] if self.current else "all regions"
 
 
 class CGController:
@@ -370,21 +2102,51 @@ class CGController:
         self.app = app
         self.video_window = None
         self.is_running = False
+        self.trigger_crop = config["trigger_crop"]
+        self.stop_crop = config["stop_crop"]
+        self.table = {}
+
+        # Starting VLC takes a while, so it warms up without holding anything else up
+        self.player = None
+        self._warmup = threading.Thread(target=self._warm_up, daemon=True)
+        self._warmup.start()
+
+    def _warm_up(self):
+        try:
+            self.player = self._create_player()
+        except Exception as e:
+            self.app.message_logged.emit(f"[ERROR] CG video unavailable: {type(e).__name__}: {e}")
+            return
+        self.app.message_logged.emit(startup_message("CG video ready"))
+
+    def _create_player(self):
+        """Preload the VLC player and media."""
+        import vlc  # needs libvlc, so only pulled in when the CG is used
 
-        # Preload VLC player and media at initialization
         vlc_instance = vlc.Instance("--no-video-title-show", "--quiet")
-        self.player = vlc_instance.media_player_new()
-        media = vlc_instance.media_new(os.path.abspath(config["video_path"]))
-        self.player.set_media(media)
-        self.player.audio_set_mute(True)
+        player = vlc_instance.media_player_new()
+        media = vlc_instance.media_new(os.path.abspath(self.config["video_path"]))
+        player.set_media(media)
+        player.audio_set_mute(True)
         # Parse media to preload it without playing
-        self.player.play()
+        player.play()
         time.sleep(0.1)  # Brief delay to allow parsing
-        self.player.pause()
-        self.player.stop()
-
-    def update(self, screenshot):
-        """Update CG state based on screenshot."""
+        player.pause()
+        player.stop()
+        return player
+
+    def rebase(self, capture):
+        """Point the marker crops at the frames capture hands out."""
+        self.trigger_crop = capture.map_crop(self.config["trigger_crop"])
+        self.stop_crop = capture.map_crop(self.config["stop_crop"])
+
+    @property
+    def crop(self):
+        """Crop to hash this tick: the stop marker while playing, else the trigger."""
+        return self.stop_crop if self.is_running else self.trigger_crop
+
+    def update(self, hash_value):
+        """Update CG state based on this tick's hash of the active marker crop."""
         if not self.app.cg_enabled:
             if self.is_running and self.video_window:
                 self.video_window.close()
@@ -392,17 +2154,8 @@ class CGController:
             self.is_running = False
             return
 
-        # Choose crop region based on current state
-        if self.is_running:
-            crop_rect = self.config["stop_crop"]
-        else:
-            crop_rect = self.config["trigger_crop"]
-
         # Check for trigger/stop markers
-        x, y, w, h = crop_rect
-        cropped_image = screenshot.crop((x, y, x + w, y + h))
-        hash_key = str(get_perceptual_hash(cropped_image))
-        tag = self.app.db.get(hash_key, "").strip()
+        tag = self.table.get(hash_value, "")
 
         if not self.is_running and tag == "__START_CG__":
             self._start_cg()
@@ -411,6 +2164,9 @@ class CGController:
 
     def _start_cg(self):
         """Start playing cutscene video."""
+        self._warmup.join()
+        if self.player is None:
+            return  # warm-up failed and said so
         # Reset player to start position
         self.player.set_position(0.0)
         # Create video window with preloaded player
@@ -429,10 +2185,430 @@ class CGController:
         self.app.log("CG stopped")
 
 
+# SCHEDULING
+
+class AdaptiveScheduler:
+    """Picks the next poll interval from screen activity, tick cost and a CPU budget.
+
+    Polls at MIN_INTERVAL while crops are changing and backs off towards
+    IDLE_INTERVAL while the screen is static. Once a second it measures the
+    process CPU use and raises or relaxes a floor under the interval to hold
+    it near the budget. A tick that takes longer than its interval counts as
+    an overrun and the next one is never scheduled sooner than it took.
+    """
+
+    BACKOFF = 1.25
+    WINDOW = 1.0  # seconds
+
+    def __init__(self, cpu_budget=CPU_BUDGET, min_interval=MIN_INTERVAL,
+                 idle_interval=IDLE_INTERVAL, start_interval=CHECK_INTERVAL):
+        self.cpu_budget = cpu_budget
+        self.min_interval = min_interval
+        self.idle_interval = idle_interval
+        self.interval = float(start_interval)
+        self.budget_floor = float(min_interval)
+        self.overruns = 0
+
+        # Last window's measurements
+        self.cpu_percent = 0.0
+        self.tick_rate = 0.0
+        self.tick_ms = 0.0
+
+        self._cores = os.cpu_count() or 1
+        self._window_start = time.monotonic()
+        self._window_cpu = time.process_time()
+        self._window_ticks = 0
+        self._window_busy = 0.0
+
+    @property
+    def effective_interval(self):
+        return max(self.interval, self.budget_floor)
+
+    def record(self, busy, active):
+        """Account for a tick that took busy seconds; return the next interval in ms."""
+        busy_ms = busy * 1000
+        if busy_ms > self.effective_interval:
+            self.overruns += 1
+        self._window_ticks += 1
+        self._window_busy += busy
+
+        if active:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.BACKOFF, self.idle_interval)
+        self._update_budget()
+
+        return math.ceil(max(self.effective_interval, busy_ms))
+
+    def _update_budget(self):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.WINDOW:
+            return
+
+        cpu_now = time.process_time()
+        self.cpu_percent = (cpu_now - self._window_cpu) / elapsed / self._cores * 100
+        self.tick_rate = self._window_ticks / elapsed
+        self.tick_ms = self._window_busy / self._window_ticks * 1000 if self._window_ticks else 0.0
+
+        if self.cpu_percent > self.cpu_budget:
+            scale = self.cpu_percent / self.cpu_budget
+            self.budget_floor = min(max(self.budget_floor * scale, self.budget_floor + 1), 1000.0)
+        elif self.cpu_percent < self.cpu_budget * 0.7:
+            self.budget_floor = max(self.budget_floor * 0.8, self.min_interval)
+
+        self._window_start = now
+        self._window_cpu = cpu_now
+        self._window_ticks = 0
+        self._window_busy = 0.0
+
+
+# INSTRUMENTATION
+
+STATS_WINDOW = 1024  # samples kept per stage for the rolling percentiles
+TRACE_CAPACITY = 200_000  # spans kept by the tracer, several minutes of busy polling
+TRACE_SECONDS = 30  # how far back a trace dump reaches
+
+# Detection stages run on the worker thread, the rest on the GUI thread
+STAGES = ("capture", "crop", "hash", "lookup", "detect", "cg_update", "update", "paint")
+
+
+class StageStats:
+    """Rolling timings per pipeline stage, cheap enough to leave on.
+
+    Recording writes one float into a fixed ring per stage; percentiles are
+    only worked out when someone asks for them.
+    """
+
+    def __init__(self, window=STATS_WINDOW):
+        self.window = window
+        self.samples = {stage: np.zeros(window) for stage in STAGES}
+        self.counts = dict.fromkeys(STAGES, 0)
+
+    def record(self, stage, seconds):
+        count = self.counts[stage]
+        self.samples[stage][count % self.window] = seconds * 1000
+        self.counts[stage] = count + 1
+
+    def reset(self):
+        for stage in STAGES:
+            self.counts[stage] = 0
+
+    def summary(self):
+        """Per stage: total count and p50/p95/p99/max in ms over the window."""
+        summary = {}
+        for stage in STAGES:
+            count = self.counts[stage]
+            recent = self.samples[stage][:min(count, self.window)]
+            if len(recent):
+                p50, p95, p99 = np.percentile(recent, (50, 95, 99)).tolist()
+                peak = float(recent.max())
+            else:
+                p50 = p95 = p99 = peak = 0.0
+            summary[stage] = {"count": count, "p50": p50, "p95": p95, "p99": p99, "max": peak}
+        return summary
+
+    def format(self):
+        """Fixed-width table for the console."""
+        lines = [f"{'stage':<9} {'count':>7} {'p50':>6} {'p95':>6} {'p99':>6}"]
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<9} {s['count']:>7} {s['p50']:>6.2f} {s['p95']:>6.2f} {s['p99']:>6.2f}")
+        return "\n".join(lines)
+
+    def export(self, base_path):
+        """Write the summary to base_path.json and base_path.csv."""
+        summary = self.summary()
+        with open(base_path + ".json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        with open(base_path + ".csv", "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["stage", "count", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+            for stage, s in summary.items():
+                writer.writerow([stage, s["count"], s["p50"], s["p95"], s["p99"], s["max"]])
+        return base_path + ".json", base_path + ".csv"
+
+
+TICK_STATS = StageStats()
+
+
+class Tracer:
+    """Opt-in ring buffer of timed spans, dumped as Chrome/Perfetto trace JSON.
+
+    Spans are kept as (name, start, end, thread, args) with perf_counter times
+    and only turned into trace events when dumped. Spans that overlap on one
+    thread show up nested in the viewer.
+    """
+
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.enabled = False
+        self.spans = deque(maxlen=capacity)
+        self.thread_names = {}
+        self._lock = threading.Lock()
+
+    def name_thread(self, name):
+        """Label the calling thread in dumped traces."""
+        self.thread_names[threading.get_ident()] = name
+
+    def span(self, name, start, end, **args):
+        if self.enabled:
+            with self._lock:
+                self.spans.append((name, start, end, threading.get_ident(), args))
+
+    def dump(self, path, seconds=None):
+        """Write the spans that ended in the last `seconds` (all if None) to path."""
+        with self._lock:
+            spans = list(self.spans)
+        if seconds is not None:
+            cutoff = time.perf_counter() - seconds
+            spans = [span for span in spans if span[2] >= cutoff]
+
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self.thread_names.items()
+        ]
+        for name, start, end, tid, args in spans:
+            events.append({
+                "name": name, "ph": "X", "pid": pid, "tid": tid,
+                "ts": (start - STARTUP_TIME) * 1e6, "dur": (end - start) * 1e6, "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(spans)
+
+
+TRACER = Tracer()
+
+
+# DETECTION WORKER
+
+class TickResult:
+    """What one detection pass found: the CG marker key and region matches."""
+
+    def __init__(self):
+        self.cg = None
+        self.regions = {}  # RegionController -> (hash, text, note)
+
+    def __bool__(self):
+        return self.cg is not None or bool(self.regions)
+
+    def merge(self, newer):
+        """Fold a newer result in, keeping the latest answer per crop."""
+        if newer.cg is not None:
+            self.cg = newer.cg
+        self.regions.update(newer.regions)
+        return self
+
+
+class DetectionWorker(QObject):
+    """Captures, hashes and looks up crops off the GUI thread.
+
+    Results are coalesced rather than queued: if the GUI has not picked up the
+    previous result yet, the new one is merged into it and no extra signal is
+    sent, so a busy GUI only ever sees the latest state of each crop.
+    """
+
+    results_ready = pyqtSignal()
+    budget_changed = pyqtSignal(int)
+
+    def __init__(self, app, capture, hasher=None):
+        super().__init__()
+        self.app = app
+        self.capture = capture
+        self.hasher = hasher or BatchHasher()
+        self.dirty_map = DirtyMap()
+        self.scheduler = AdaptiveScheduler()
+        self.timer = None
+        self._running = False
+        self._pending = None
+        self._lock = threading.Lock()
+        self._invalidate = False
+        self._showing = {}  # RegionController -> whether its last result had text
+        self._stale = set()  # skipped under a higher-priority match, so hash when next reached
+        self.budget_changed.connect(self._set_budget)
+
+    @pyqtSlot()
+    def start(self):
+        """Start polling; runs in the worker thread."""
+        TRACER.name_thread("detection")
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._on_timer)
+        self._running = True
+        self.timer.start(CHECK_INTERVAL)
+
+    @pyqtSlot()
+    def stop(self):
+        self._running = False
+        if self.timer:
+            self.timer.stop()
+
+    @pyqtSlot(int)
+    def _set_budget(self, percent):
+        self.scheduler.cpu_budget = percent
+
+    def invalidate(self):
+        """Hash every crop again on the next pass."""
+        self._invalidate = True
+
+    def detect(self):
+        """Capture one frame and return a TickResult for the crops that changed.
+
+        Changed scene anchors are hashed first, so only the current scene's
+        regions are looked at. Those go one priority level at a time: once a
+        member of a group shows something, the members below it are not
+        cropped or hashed, and any of them still showing is hidden.
+        """
+        if self._invalidate:
+            self._invalidate = False
+            self.dirty_map.invalidate()
+
+        start = time.perf_counter()
+        gray = self.capture.grab_gray()
+        captured = time.perf_counter()
+        self.dirty_map.update(gray)
+
+        cg = self.app.cg_controller
+        scenes = self.app.scenes
+        hash_cg = self.app.cg_enabled and self.dirty_map.is_dirty(cg.crop)
+        result = TickResult()
+        tracing = TRACER.enabled
+        crop_time = hash_time = lookup_time = 0.0
+        hashed = 0
+        level = 0
+        selected = captured
+
+        anchors = scenes.dirty_anchors(self.dirty_map) if self.app.translation_enabled else []
+        if anchors:
+            rects = ([cg.crop] if hash_cg else []) + [scenes.anchors[i]["crop"] for i in anchors]
+            cropped = time.perf_counter()
+            values = self.hasher.hash_rects(gray, rects).tolist()
+            looked_up = time.perf_counter()
+            if hash_cg:
+                result.cg = values.pop(0)
+                hash_cg = False
+            left, entered = scenes.update(anchors, values)
+            if left or entered:
+                self._change_scene(left, entered, result)
+            done = time.perf_counter()
+            crop_time += cropped - selected
+            hash_time += looked_up - cropped
+            lookup_time += done - looked_up
+            hashed += len(rects)
+            if tracing:
+                TRACER.span("scene", selected, done, anchors=len(anchors), scene=scenes.name)
+            selected = done
+
+        groups = scenes.groups if self.app.translation_enabled else []
+
+        while groups or hash_cg:
+            # Only re-hash crops whose tiles changed since the last frame
+            members = [group[level] for group in groups]
+            regions = [c for c in members if c in self._stale or self.dirty_map.is_dirty(c.crop)]
+            rects = ([cg.crop] if hash_cg else []) + [c.crop for c in regions]
+            cropped = time.perf_counter()
+            values = self.hasher.hash_rects(gray, rects).tolist()
+            looked_up = time.perf_counter()
+
+            if hash_cg:
+                result.cg = values.pop(0)
+                hash_cg = False
+            for controller, hash_value in zip(regions, values):
+                matched = time.perf_counter()
+                match = result.regions[controller] = controller.match(hash_value)
+                self._showing[controller] = bool(match[1])
+                self._stale.discard(controller)
+                if tracing:
+                    TRACER.span("match", matched, time.perf_counter(),
+                                region=controller.region_index, hash=hash_to_key(hash_value))
+
+            # A group is settled by its highest member showing something
+            still_open = []
+            for group, member in zip(groups, members):
+                if self._showing.get(member):
+                    self._skip(group[level + 1:], result)
+                elif level + 1 < len(group):
+                    still_open.append(group)
+            groups = still_open
+            level += 1
+
+            done = time.perf_counter()
+            crop_time += cropped - selected
+            hash_time += looked_up - cropped
+            lookup_time += done - looked_up
+            hashed += len(rects)
+            if tracing:
+                TRACER.span("crop", selected, cropped, level=level)
+                TRACER.span("hash", cropped, looked_up, rects=len(rects))
+                TRACER.span("lookup", looked_up, done)
+            selected = done
+
+        done = time.perf_counter()
+        TICK_STATS.record("capture", captured - start)
+        TICK_STATS.record("crop", crop_time)
+        if hashed:
+            TICK_STATS.record("hash", hash_time)
+            TICK_STATS.record("lookup", lookup_time)
+        TICK_STATS.record("detect", done - start)
+        if tracing:
+            TRACER.span("detect", start, done, rects=hashed, levels=level)
+            TRACER.span("capture", start, captured)
+        return result
+
+    def _change_scene(self, left, entered, result):
+        """Hide the regions of the scene that ended and look at the new ones afresh."""
+        for controller in left:
+            self._stale.add(controller)
+            if self._showing.pop(controller, False):
+                result.regions[controller] = (None, "", "")
+        # Their crops were not watched while inactive, so hash them whether dirty or not
+        self._stale.update(entered)
+        self.app.message_logged.emit(f"Scene: {self.app.scenes.name}")
+
+    def _skip(self, controllers, result):
+        """Leave lower-priority regions alone this tick, hiding any that still show.
+
+        Those hidden, or whose crop changed unseen, get hashed when next reached.
+        """
+        for controller in controllers:
+            if self._showing.pop(controller, False):
+                result.regions[controller] = (None, "", "")
+                self._stale.add(controller)
+            elif self.dirty_map.is_dirty(controller.crop):
+                self._stale.add(controller)
+
+    def take(self):
+        """Hand the pending result to the GUI thread."""
+        with self._lock:
+            result, self._pending = self._pending, None
+        return result
+
+    def _on_timer(self):
+        start = time.perf_counter()
+        result = self.detect()
+        busy = time.perf_counter() - start
+
+        if result:
+            with self._lock:
+                notify = self._pending is None
+                self._pending = result if notify else self._pending.merge(result)
+            if notify:
+                self.results_ready.emit()
+
+        # Poll fast while something on screen is changing, back off otherwise
+        if self._running:
+            self.timer.start(self.scheduler.record(busy, active=bool(result)))
+
+
 # MAIN CONTROL PANEL
 
 class ControlPanel(QWidget):
     """Main control panel for the translation overlay system."""
+
+    cg_controller_class = CGController
+
+    controllers_loaded = pyqtSignal(object)
+    message_logged = pyqtSignal(str)  # log() for other threads
     
     def __init__(self):
         super().__init__(None, Qt.WindowStaysOnTopHint)
@@ -442,17 +2618,23 @@ class ControlPanel(QWidget):
         # Application state
         self.translation_enabled = True
         self.cg_enabled = True
-        self.db = load_database()
+        self.db = None
+        self.region_controllers = []
+        self.scenes = None
+        self.cg_controller = None
+        self.worker = None
 
         # Initialize UI
         self._create_widgets()
         self._setup_layout()
         self._connect_signals()
-        self._initialize_controllers()
         
+        # Show the console first, everything else loads behind it
         self.show()
         hide_from_capture(int(self.winId()))
-        self.log(f"UI ready - polling every {self.update_timer.interval()} ms")
+        TRACER.name_thread("GUI")
+        self.log(startup_message("console shown"))
+        self._load_controllers()
 
     def _create_widgets(self):
         """Create all UI widgets."""
@@ -460,10 +2642,24 @@ class ControlPanel(QWidget):
         self.chk_translation = QCheckBox("Enable translation", checked=True)
         self.chk_cg = QCheckBox("Play opening CG", checked=True)
         
-        # Polling interval input
-        self.edit_interval = QLineEdit(str(CHECK_INTERVAL))
-        self.edit_interval.setValidator(QIntValidator(1, 60000, self))
-        self.edit_interval.setMaximumWidth(120)
+        # CPU budget input
+        self.edit_budget = QLineEdit(str(CPU_BUDGET))
+        self.edit_budget.setValidator(QIntValidator(1, 100, self))
+        self.edit_budget.setMaximumWidth(120)
+
+        # Polling and change detection stats
+        self.lbl_rate = QLabel("Polling: -")
+        self.lbl_stats = QLabel("Unchanged crops skipped: -")
+
+        # Per-stage timings
+        self.stage_display = QPlainTextEdit(readOnly=True)
+        self.stage_display.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.stage_display.setFixedHeight(150)
+        self.btn_export_stats = QPushButton("Export timings")
+
+        # Tracing
+        self.chk_trace = QCheckBox("Record trace")
+        self.btn_dump_trace = QPushButton(f"Dump last {TRACE_SECONDS}s of trace")
 
         # Log area
         self.log_display = QPlainTextEdit(readOnly=True)
@@ -478,12 +2674,25 @@ class ControlPanel(QWidget):
         layout.addWidget(self.chk_translation)
         layout.addWidget(self.chk_cg)
         
-        # Polling interval
-        interval_layout = QHBoxLayout()
-        interval_layout.addWidget(QLabel("Screenshot interval (ms):"))
-        interval_layout.addWidget(self.edit_interval)
-        interval_layout.addStretch(1)
-        layout.addLayout(interval_layout)
+        # CPU budget
+        budget_layout = QHBoxLayout()
+        budget_layout.addWidget(QLabel("CPU budget (%):"))
+        budget_layout.addWidget(self.edit_budget)
+        budget_layout.addStretch(1)
+        layout.addLayout(budget_layout)
+        layout.addWidget(self.lbl_rate)
+        layout.addWidget(self.lbl_stats)
+
+        # Stage timings
+        layout.addWidget(QLabel("Stage timings (ms):"))
+        layout.addWidget(self.stage_display)
+        layout.addWidget(self.btn_export_stats)
+
+        # Tracing
+        trace_layout = QHBoxLayout()
+        trace_layout.addWidget(self.chk_trace)
+        trace_layout.addWidget(self.btn_dump_trace)
+        layout.addLayout(trace_layout)
         
         # Log display
         layout.addWidget(QLabel("Log:"))
@@ -492,22 +2701,109 @@ class ControlPanel(QWidget):
     def _connect_signals(self):
         """Connect widget signals to handlers."""
         self.chk_translation.stateChanged.connect(
-            lambda state: setattr(self, "translation_enabled", bool(state))
+            lambda state: self._set_enabled("translation_enabled", state)
         )
         self.chk_cg.stateChanged.connect(
-            lambda state: setattr(self, "cg_enabled", bool(state))
+            lambda state: self._set_enabled("cg_enabled", state)
         )
-        self.edit_interval.editingFinished.connect(self._apply_interval)
-
-    def _initialize_controllers(self):
-        """Initialize region and CG controllers."""
-        self.region_controllers = [RegionController(config, self) for config in REGION_CFG]
-        self.cg_controller = CGController(CG_CFG, self)
-        
-        # Start main update timer
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self._update_tick)
-        self.update_timer.start(CHECK_INTERVAL)
+        self.edit_budget.editingFinished.connect(self._apply_budget)
+        self.btn_export_stats.clicked.connect(self.export_stats)
+        self.chk_trace.stateChanged.connect(lambda state: setattr(TRACER, "enabled", bool(state)))
+        self.btn_dump_trace.clicked.connect(self.dump_trace)
+        self.message_logged.connect(self.log)
+        self.controllers_loaded.connect(self._initialize_controllers)
+
+    def _load_controllers(self):
+        """Build the controllers on a background thread; they arrive via controllers_loaded."""
+        threading.Thread(target=self._load_in_background, daemon=True).start()
+
+    def _load_in_background(self):
+        try:
+            loaded = self._build_controllers()
+        except Exception as e:
+            traceback.print_exc()
+            self.message_logged.emit(
+                f"[ERROR] Startup failed, detection is not running: {type(e).__name__}: {e}"
+            )
+            return
+        self.controllers_loaded.emit(loaded)
+
+    def _build_controllers(self):
+        """Load the database and build the controllers and hasher (no widgets involved)."""
+        db = load_compiled_database()
+        self.message_logged.emit(startup_message(f"database loaded ({db.entry_count()} entries)"))
+
+        region_controllers = [
+            RegionController(config, self, index) for index, config in enumerate(REGION_CFG)
+        ]
+        cg_controller = self.cg_controller_class(CG_CFG, self)
+        scenes = SceneTracker(SCENE_CFG, region_controllers)
+
+        # Each region only matches the entries captured from it, the CG only its markers
+        markers = [index for tag in CG_TAGS for index in db.find_text(tag)]
+        cg_controller.table = {int(db.keys[index]): db.entry_text(index).strip() for index in markers}
+        shared_ahead = db.capture_positions(db.showable(None, markers))
+        for controller in region_controllers:
+            controller.set_database(db, markers, shared_ahead)
+
+        # Only grab the screen area the crops actually cover
+        capture = self._create_capture(compute_capture_rect(REGION_CFG, CG_CFG, NATIVE_CFG, SCENE_CFG))
+        for result in capture.benchmark:
+            self.message_logged.emit(format_benchmark(result))
+        self.message_logged.emit(f"Capturing with {capture.backend.name}")
+        if NATIVE_CFG:
+            capture = NativeCapture(capture, NATIVE_CFG["screens"])
+            self.message_logged.emit(f"Native DS mode, matching against {HASH_DB_FILE}")
+
+        # Report every crop native mode cannot place before giving up
+        failed = 0
+        named = [(f"Region {index}", c) for index, c in enumerate(region_controllers)]
+        for name, controller in (*named, ("CG", cg_controller), ("Scene anchors", scenes)):
+            try:
+                controller.rebase(capture)
+            except ValueError as e:
+                self.message_logged.emit(f"[ERROR] {name}: {e}")
+                failed += 1
+        if failed:
+            raise ValueError(f"{failed} crop(s) could not be mapped onto the capture")
+
+        return db, region_controllers, cg_controller, scenes, BatchHasher(), capture
+
+    def _create_capture(self, rect):
+        """Open the screen capture for rect."""
+        return ScreenCapture(rect)
+
+    def _initialize_controllers(self, loaded):
+        """Take over the loaded controllers and start detection."""
+        self.db, self.region_controllers, self.cg_controller, self.scenes, hasher, capture = loaded
+
+        # Overlays for the lines after each match are rendered ahead of time
+        self.prefetcher = RenderPrefetcher()
+
+        # Capture and hashing run on their own thread
+        self.worker = DetectionWorker(self, capture, hasher)
+        self.worker.results_ready.connect(self._apply_pending)
+        self._start_worker()
+
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self._update_stats)
+        self.stats_timer.start(1000)
+
+        self.log(startup_message("detection running"))
+        self.log(f"UI ready - adaptive polling, CPU budget {self.worker.scheduler.cpu_budget}%")
+
+    def _start_worker(self):
+        """Move the detection worker to its own thread and start polling."""
+        self.worker_thread = QThread()
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.start)
+        self.worker_thread.start()
+        QApplication.instance().aboutToQuit.connect(self._stop_worker)
+
+    def _stop_worker(self):
+        QMetaObject.invokeMethod(self.worker, "stop", Qt.BlockingQueuedConnection)
+        self.worker_thread.quit()
+        self.worker_thread.wait(1000)
 
     # Event handlers
     def log(self, message):
@@ -516,40 +2812,108 @@ class ControlPanel(QWidget):
         self.log_display.appendPlainText(f"[{timestamp}] {message}")
         print(message)
 
-    def _apply_interval(self):
-        """Apply the polling interval from the UI."""
-        if not hasattr(self, "update_timer"):
+    def _set_enabled(self, flag, state):
+        """Toggle a feature; re-enabled controllers need every crop hashed again."""
+        setattr(self, flag, bool(state))
+        if self.worker is None:
+            return
+        if state:
+            self.worker.invalidate()
+        elif flag == "cg_enabled":
+            self.cg_controller.update(None)
+        else:
+            for controller in self.region_controllers:
+                controller.hide()
+
+    def _apply_budget(self):
+        """Apply the CPU budget from the UI."""
+        if self.worker is None:
             return
-        text = self.edit_interval.text().strip()
+        text = self.edit_budget.text().strip()
         if not text:
             return
         try:
-            interval = int(text)
+            budget = int(text)
         except ValueError:
             return
-        if interval < 1:
-            interval = 1
-            self.edit_interval.setText(str(interval))
-        self.update_timer.setInterval(interval)
-        self.log(f"Polling interval set to {interval} ms")
+        if budget < 1:
+            budget = 1
+            self.edit_budget.setText(str(budget))
+        self.worker.budget_changed.emit(budget)
+        self.log(f"CPU budget set to {budget}%")
 
     def _update_tick(self):
-        """Main update loop - called by timer."""
-        screenshot = pyautogui.screenshot()
-        self.cg_controller.update(screenshot)
-        for controller in self.region_controllers:
-            controller.update(screenshot, self.db)
+        """Run one detection pass synchronously and apply it."""
+        self._apply(self.worker.detect())
+
+    def _apply_pending(self):
+        """Apply the latest result from the worker thread."""
+        result = self.worker.take()
+        if result:
+            self._apply(result)
+
+    def _apply(self, result):
+        """Show, update or hide overlay windows for a TickResult."""
+        applied = time.perf_counter()
+        cg = self.cg_controller
+        was_running = cg.is_running
+        if result.cg is not None and self.cg_enabled:
+            start = time.perf_counter()
+            cg.update(result.cg)
+            end = time.perf_counter()
+            TICK_STATS.record("cg_update", end - start)
+            TRACER.span("cg_update", start, end)
+        if cg.is_running != was_running:
+            # The CG swaps marker crops, so look at everything fresh next pass
+            self.worker.invalidate()
+
+        if self.translation_enabled:
+            for controller, match in result.regions.items():
+                start = time.perf_counter()
+                controller.update(match)
+                end = time.perf_counter()
+                TICK_STATS.record("update", end - start)
+                TRACER.span("update", start, end, region=controller.region_index)
+        TRACER.span("apply", applied, time.perf_counter(), regions=len(result.regions))
+
+    def _update_stats(self):
+        """Refresh the polling and skip-rate readouts."""
+        scheduler = self.worker.scheduler
+        self.lbl_rate.setText(
+            f"Polling: {scheduler.tick_rate:.0f}/s, every {scheduler.effective_interval:.0f} ms, "
+            f"CPU {scheduler.cpu_percent:.1f}%, {scheduler.overruns} overruns"
+        )
+        dirty_map = self.worker.dirty_map
+        self.lbl_stats.setText(
+            f"Unchanged crops skipped: {dirty_map.skip_rate() * 100:.1f}%, "
+            f"render cache {len(RENDER_CACHE)} images / {RENDER_CACHE.bytes / 2**20:.1f} MB, "
+            f"{RENDER_CACHE.hits} hits / {RENDER_CACHE.misses} misses"
+        )
+        dirty_map.reset_stats()
+        self.stage_display.setPlainText(TICK_STATS.format())
+
+    def export_stats(self):
+        """Write the current stage timings to JSON and CSV files."""
+        paths = TICK_STATS.export(time.strftime("tick_stats_%Y%m%d_%H%M%S"))
+        self.log(f"Stage timings exported to {' and '.join(paths)}")
+
+    def dump_trace(self):
+        """Write the recent trace spans for Perfetto or chrome://tracing."""
+        if not TRACER.enabled:
+            self.log("Tick 'Record trace' first, then dump once the slow part has happened")
+            return
+        path = time.strftime("trace_%Y%m%d_%H%M%S.json")
+        count = TRACER.dump(path, TRACE_SECONDS)
+        self.log(f"Wrote {count} trace spans to {path} (open in ui.perfetto.dev)")
 
 # MAIN ENTRY POINT
 
 
-def main():
-    """Main entry point for the application."""
+def load_nds_font():
+    """Register NDS.ttf with Qt and use it as the overlay font."""
     global NDS_FAMILY
 
     font_path = beside_exe("NDS.ttf")
-    app = QApplication(sys.argv)
-
     if not os.path.exists(font_path):
         print(f"[WARN] NDS.ttf not found at: {font_path}")
     else:
@@ -563,6 +2927,12 @@ def main():
 
     print(f"[INFO] DS font family → {NDS_FAMILY}")
 
+
+def main():
+    """Main entry point for the application."""
+    app = QApplication(sys.argv)
+    load_nds_font()
+
     # Create and run control panel
     control_panel = ControlPanel()
     sys.exit(app.exec_())
@@ -0,0 +1,716 @@
+"""
+Offline tools for the hash database.
+
+    python starfy4_translation_overlay_dbtools.py compile
+    python starfy4_translation_overlay_dbtools.py decompile hash_db.bin --db hash_db.json
+    python starfy4_translation_overlay_dbtools.py rehash untranslated/ -o hash_db_new.json
+    python starfy4_translation_overlay_dbtools.py harvest world3.mp4
+    python starfy4_translation_overlay_dbtools.py cluster --distance 6 --collapse
+    python starfy4_translation_overlay_dbtools.py audit --threshold 10
+    python starfy4_translation_overlay_dbtools.py anchor frames/000420.png 700 80 64 24
+
+Translators keep editing hash_db.json; `compile` turns it (plus the colour
+overrides in overlay_regions.json) into the memory-mapped hash_db.bin the
+overlay loads at startup, and `decompile` goes the other way. `rehash`
+re-keys the database after the hashing pipeline changes, by hashing the
+saved untranslated/<key>.png captures again. `harvest` runs every region crop
+over a recording and adds each new hash as an empty entry with its capture.
+`cluster` finds entries a few bits apart and folds them into one entry with
+aliases. `audit` shows how close entries with different translations get,
+region by region, and so how much match_distance each region can afford.
+`anchor` prints the hash of any crop of a recorded frame, for scene anchors.
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import starfy4_translation_overlay as overlay
+
+
+# HELPERS
+
+def load_color_overrides(config_path):
+    """Hash colour overrides from an overlay config file."""
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, encoding="utf-8") as f:
+        return json.load(f).get("hash_color_overrides", {})
+
+
+def write_atomic(path, data):
+    """Write bytes through a temp file so readers never see half a file."""
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def write_json(path, data):
+    write_atomic(path, json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8"))
+
+
+# REHASHING
+
+def hash_capture(path):
+    """(path, new key, error) for one saved capture; runs in a worker process."""
+    try:
+        with Image.open(path) as image:
+            return path, str(overlay.get_perceptual_hash(image)), None
+    except (OSError, ValueError) as exc:
+        return path, None, str(exc)
+
+
+def rehash_captures(paths, workers=None):
+    """Hash every capture across a process pool; returns {path: key} and {path: error}."""
+    keys, errors = {}, {}
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, key, error in pool.map(hash_capture, paths, chunksize=chunksize):
+            if error is None:
+                keys[path] = key
+            else:
+                errors[path] = error
+    return keys, errors
+
+
+def merge_entries(kept, other):
+    """Fold other into kept if both say the same thing, else return None."""
+    if overlay.entry_text(kept) != overlay.entry_text(other):
+        return None
+    kept_regions, other_regions = overlay.entry_regions(kept), overlay.entry_regions(other)
+    merged = {"text": overlay.entry_text(kept)}
+    # Shared beats scoped: the text shows up in more places than either knew
+    if kept_regions is not None and other_regions is not None:
+        merged["regions"] = kept_regions + [r for r in other_regions if r not in kept_regions]
+    aliases = overlay.entry_aliases(kept) + overlay.entry_aliases(other)
+    if aliases:
+        merged["aliases"] = aliases
+    return merged if len(merged) > 1 else merged["text"]
+
+
+def migrate_database(db, overrides, key_map):
+    """Re-key db and colour overrides with an {old key: new key} map.
+
+    Entries keep their (capture) order. When several old keys land on one new
+    key, identical translations are merged and conflicting ones keep the
+    first entry. Returns (db, overrides, report).
+    """
+    aliases = overlay.alias_table(db)
+    new_db = {}
+    sources = {}
+    collisions = {}
+    for old, entry in db.items():
+        new = key_map.get(old)
+        if new is None:
+            continue
+        if new not in new_db:
+            new_db[new] = entry
+            sources[new] = [old]
+            continue
+        sources[new].append(old)
+        merged = merge_entries(new_db[new], entry)
+        collision = collisions.setdefault(new, {"new": new, "old": sources[new], "conflict": False})
+        if merged is None:
+            collision["conflict"] = True
+        else:
+            new_db[new] = merged
+
+    # Aliases are re-keyed from their own captures like everything else
+    dropped_aliases = []
+    claimed = set()
+    for new, entry in new_db.items():
+        aliases = overlay.entry_aliases(entry)
+        if not aliases:
+            continue
+        kept = []
+        for old in aliases:
+            alias = key_map.get(old)
+            if alias is None or alias in new_db or alias in claimed:
+                dropped_aliases.append(old)
+            else:
+                kept.append(alias)
+                claimed.add(alias)
+        new_db[new] = dict(entry, aliases=kept)
+        if not kept:
+            del new_db[new]["aliases"]
+
+    new_overrides = {}
+    for old, color in overrides.items():
+        new = key_map.get(old)
+        if new is not None and (new not in new_overrides or sources.get(new, [old])[0] == old):
+            new_overrides[new] = color
+
+    report = {
+        "rehashed": len(key_map),
+        "changed": sum(1 for old, new in key_map.items() if old != new and old in db),
+        "collisions": list(collisions.values()),
+        "missing_captures": [old for old in db if old not in key_map],
+        "unused_captures": [old for old in key_map if old not in db and old not in aliases],
+        "orphaned_overrides": [old for old in overrides if old not in key_map],
+        "dropped_aliases": dropped_aliases,
+    }
+    return new_db, new_overrides, report
+
+
+# HARVESTING
+
+class FrameFeed(overlay.CaptureBackend):
+    """Capture backend that serves whichever recorded frame it was last given."""
+
+    name = "feed"
+    _fit = overlay.FileCapture._fit
+
+    def __init__(self, rect):
+        super().__init__(rect)
+        self.frame = None
+
+    def grab(self):
+        return self._fit(self.frame)
+
+
+def open_harvest_capture():
+    """Capture over a FrameFeed, set up exactly like the overlay's own."""
+    rect = overlay.compute_capture_rect(
+        overlay.REGION_CFG, overlay.CG_CFG, overlay.NATIVE_CFG, overlay.SCENE_CFG
+    )
+    feed = FrameFeed(rect)
+    capture = overlay.ScreenCapture(rect, feed)
+    if overlay.NATIVE_CFG:
+        capture = overlay.NativeCapture(capture, overlay.NATIVE_CFG["screens"])
+    crops = [capture.map_crop(region["crop"], region.get("ds_crop"))
+             for region in overlay.REGION_CFG]
+    return feed, capture, crops
+
+
+def harvest_frames(source, indices):
+    """Hash every region crop of some frames; runs in a worker process.
+
+    Returns {key: [first frame, frames seen, regions, RGB crop]} with one
+    crop per distinct hash, taken from the frame it first appeared in.
+    """
+    frames = overlay.load_frames(source, lazy=True)
+    feed, capture, crops = open_harvest_capture()
+    hasher = overlay.BatchHasher()
+    found = {}
+    for index in indices:
+        feed.frame = frames[index]
+        gray = capture.grab_gray()
+        bgrx = capture.buffer.frames[capture.buffer.index]
+        for region, (value, (x, y, w, h)) in enumerate(zip(hasher.hash_rects(gray, crops).tolist(), crops)):
+            key = overlay.hash_to_key(value)
+            if key not in found:
+                found[key] = [index, 0, set(), bgrx[y:y + h, x:x + w, 2::-1].copy()]
+            found[key][1] += 1
+            found[key][2].add(region)
+    return found
+
+
+def harvest(source, workers=None, step=1):
+    """Hash every region of every step-th frame across a process pool.
+
+    Returns the merged {key: [first frame, frames seen, regions, crop]}.
+    """
+    count = len(overlay.load_frames(source, lazy=True))
+    indices = list(range(0, count, step))
+    workers = workers or os.cpu_count() or 1
+    size = max(1, -(-len(indices) // (workers * 4)))
+    chunks = [indices[i:i + size] for i in range(0, len(indices), size)]
+
+    found = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in pool.map(harvest_frames, [source] * len(chunks), chunks):
+            for key, (first, seen, regions, crop) in chunk.items():
+                if key not in found:
+                    found[key] = [first, seen, regions, crop]
+                    continue
+                found[key][1] += seen
+                found[key][2] |= regions
+    return found
+
+
+# CLUSTERING
+
+def region_masks(db, keys, aliases, region_count=0):
+    """(keys, words) uint64 region bitmasks (aliases take their entry's), all bits if shared.
+
+    Wide enough for region_count regions and every region an entry names.
+    """
+    regions = [overlay.entry_regions(db[aliases.get(key, key)]) for key in keys]
+    scoped = [region for entry in regions if entry is not None for region in entry]
+    words = overlay.region_words(max(region_count, max(scoped, default=-1) + 1))
+    masks = np.empty((len(keys), words), dtype=np.uint64)
+    for index, entry in enumerate(regions):
+        masks[index] = overlay.region_bitmask(entry, words)
+    return masks
+
+
+def cluster_keys(db, max_distance):
+    """Group database entries whose hashes are at most max_distance bits apart.
+
+    Only entries that can show up in the same region are linked, and an
+    entry's existing aliases count as part of it. Returns lists of entry
+    keys in database order, biggest cluster first; lone entries are left out.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    aliases = overlay.alias_table(db)
+    keys = list(db) + list(aliases)
+    position = {key: index for index, key in enumerate(keys)}
+    values = np.array([int(key, 16) for key in keys], dtype=np.uint64)
+
+    i, j, _ = overlay.close_pairs(values, max_distance)
+    masks = region_masks(db, keys, aliases)
+    same_region = (masks[i] & masks[j]).any(axis=1)
+    owners = np.array([position[aliases[key]] for key in keys[len(db):]], dtype=np.intp)
+    i = np.concatenate([i[same_region], np.arange(len(db), len(keys))])
+    j = np.concatenate([j[same_region], owners])
+
+    graph = coo_matrix((np.ones(len(i), dtype=np.uint8), (i, j)), shape=(len(keys), len(keys)))
+    _, labels = connected_components(graph, directed=False)
+    groups = {}
+    for key, label in zip(db, labels[:len(db)].tolist()):
+        groups.setdefault(label, []).append(key)
+    return sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+
+def cluster_texts(db, keys):
+    """Distinct non-empty translations within a cluster."""
+    texts = []
+    for key in keys:
+        text = overlay.entry_text(db[key]).strip()
+        if text and text not in texts:
+            texts.append(text)
+    return texts
+
+
+def collapse_cluster(db, overrides, keys):
+    """Fold a cluster into its first translated entry, the rest becoming aliases.
+
+    Returns the canonical key, or None (and changes nothing) if the cluster
+    holds different translations.
+    """
+    if len(cluster_texts(db, keys)) > 1:
+        return None
+    canonical = next((k for k in keys if overlay.entry_text(db[k]).strip()), keys[0])
+
+    regions, aliases = [], []
+    for key in keys:
+        entry_regions = overlay.entry_regions(db[key])
+        if regions is not None:
+            regions = None if entry_regions is None else regions + [
+                r for r in entry_regions if r not in regions
+            ]
+        if key != canonical:
+            aliases.append(key)
+        aliases += overlay.entry_aliases(db[key])
+
+    entry = {"text": overlay.entry_text(db[canonical])}
+    if regions is not None:
+        entry["regions"] = regions
+    entry["aliases"] = aliases
+    db[canonical] = entry
+
+    color = overrides.get(canonical)
+    for key in keys:
+        if key != canonical:
+            del db[key]
+            color = overrides.pop(key, None) if color is None else color
+            overrides.pop(key, None)
+    if color is not None:
+        overrides[canonical] = color
+    return canonical
+
+
+def cluster_sheet(db, keys, captures, path):
+    """Save the cluster's captures stacked in one labelled PNG."""
+    images = []
+    for key in keys:
+        capture = os.path.join(captures, f"{key}.png")
+        if os.path.exists(capture):
+            with Image.open(capture) as image:
+                images.append((key, image.convert("RGB")))
+    if not images:
+        return False
+    label = 14
+    width = max(image.width for _, image in images)
+    sheet = Image.new("RGB", (width, sum(image.height + label for _, image in images)), "black")
+    draw = ImageDraw.Draw(sheet)
+    y = 0
+    for key, image in images:
+        text = overlay.entry_text(db[key]).strip().splitlines()
+        draw.text((2, y + 1), f"{key}  {text[0] if text else ''}", fill="white")
+        sheet.paste(image, (0, y + label))
+        y += image.height + label
+    sheet.save(path)
+    return True
+
+
+# AUDIT
+
+def safe_tolerance(closest):
+    """Largest match_distance at which no hash is within reach of two different texts."""
+    return (closest - 1) // 2
+
+
+def audit_collisions(db, region_config, threshold):
+    """Find translated entries (and aliases) that differ in text but not by much in hash.
+
+    Returns (regions, pairs): per-region stats, and every conflicting pair at
+    most threshold bits apart that can meet in at least one region, closest
+    first. CG markers are left out; they only ever match exactly.
+    """
+    aliases = overlay.alias_table(db)
+    keys, texts = [], []
+    for key in list(db) + list(aliases):
+        text = overlay.entry_text(db[aliases.get(key, key)]).strip()
+        if text and text not in overlay.CG_TAGS:
+            keys.append(key)
+            texts.append(text)
+
+    text_ids = {text: index for index, text in enumerate(dict.fromkeys(texts))}
+    ids = np.array([text_ids[text] for text in texts], dtype=np.intp)
+    values = np.array([int(key, 16) for key in keys], dtype=np.uint64)
+    masks = region_masks(db, keys, aliases, len(region_config))
+
+    i, j, distance = overlay.close_pairs(values, threshold)
+    shared = masks[i] & masks[j]
+    conflict = (ids[i] != ids[j]) & shared.any(axis=1)
+    i, j, distance, shared = i[conflict], j[conflict], distance[conflict], shared[conflict]
+
+    regions = []
+    for index, config in enumerate(region_config):
+        in_region = overlay.has_region(shared, index)
+        hits = distance[in_region]
+        closest = int(hits.min()) if len(hits) else None
+        regions.append({
+            "region": index,
+            "entries": int(np.count_nonzero(overlay.has_region(masks, index))),
+            "pairs": int(len(hits)),
+            "closest": closest,
+            "safe_distance": safe_tolerance(closest) if closest is not None else threshold // 2,
+            "match_distance": int(config.get("match_distance", 0)),
+            "histogram": np.bincount(hits, minlength=threshold + 1).tolist(),
+        })
+
+    pairs = []
+    for pair in sorted(range(len(i)), key=lambda pair: distance[pair]):
+        a, b = int(i[pair]), int(j[pair])
+        regions_met = overlay.bitmask_regions(shared[pair])
+        pairs.append({
+            "distance": int(distance[pair]),
+            "keys": [keys[a], keys[b]],
+            "texts": [texts[a], texts[b]],
+            "regions": [
+                r for r in range(len(region_config)) if regions_met is None or r in regions_met
+            ],
+        })
+    return regions, pairs
+
+
+# COMMANDS
+
+def cmd_compile(args):
+    overlay.HASH_DB_FILE = args.db
+    db = overlay.load_database()
+    overrides = load_color_overrides(args.config)
+    out = args.out or overlay.compiled_db_path(args.db)
+
+    data = overlay.pack_database(db, overrides)
+    compiled = overlay.CompiledDatabase(data)
+    if compiled.to_json() != (db, overrides):
+        print("[WARN] Compiled database does not round-trip exactly "
+              "(colour spellings or non-canonical entries were normalized)")
+    write_atomic(out, data)
+    print(f"Compiled {len(db)} entries and {len(overrides)} colour overrides "
+          f"into {out} ({len(data)} bytes)")
+    return 0
+
+
+def cmd_decompile(args):
+    compiled = overlay.CompiledDatabase.open(args.compiled)
+    db, overrides = compiled.to_json()
+
+    with open(args.db, "w", encoding="utf-8") as f:
+        json.dump(db, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {len(db)} entries to {args.db}")
+
+    if args.config:
+        config = {}
+        if os.path.exists(args.config):
+            with open(args.config, encoding="utf-8") as f:
+                config = json.load(f)
+        config["hash_color_overrides"] = overrides
+        with open(args.config, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2, ensure_ascii=False)
+        print(f"Wrote {len(overrides)} colour overrides to {args.config}")
+    return 0
+
+
+def cmd_rehash(args):
+    overlay.HASH_DB_FILE = args.db
+    db = overlay.load_database()
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    overrides = config.get("hash_color_overrides", {})
+
+    paths = sorted(
+        os.path.join(args.captures, name) for name in os.listdir(args.captures)
+        if name.lower().endswith(".png")
+    )
+    start = time.perf_counter()
+    keys, errors = rehash_captures(paths, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"Hashed {len(keys)} captures in {elapsed:.1f}s")
+    for path, error in errors.items():
+        print(f"[WARN] Could not hash {path}: {error}")
+
+    key_map = {os.path.splitext(os.path.basename(path))[0]: key for path, key in keys.items()}
+    new_db, new_overrides, report = migrate_database(db, overrides, key_map)
+    report["errors"] = errors
+
+    print(f"{report['changed']} of {len(db)} keys changed, {len(new_db)} entries written")
+    for collision in report["collisions"]:
+        kind = "CONFLICT" if collision["conflict"] else "merged"
+        print(f"  {kind}: {', '.join(collision['old'])} -> {collision['new']}")
+    if report["missing_captures"]:
+        print(f"{len(report['missing_captures'])} entries have no capture and were dropped")
+    if report["unused_captures"]:
+        print(f"{len(report['unused_captures'])} captures have no database entry")
+    if report["dropped_aliases"]:
+        print(f"{len(report['dropped_aliases'])} aliases had no capture or now clash and were dropped")
+    if report["orphaned_overrides"]:
+        print(f"{len(report['orphaned_overrides'])} colour overrides had no capture and were dropped")
+
+    write_json(args.out, new_db)
+    print(f"Wrote {args.out}")
+    if args.config_out:
+        config["hash_color_overrides"] = new_overrides
+        write_json(args.config_out, config)
+        print(f"Wrote {len(new_overrides)} colour overrides to {args.config_out}")
+    if args.report:
+        report["map"] = key_map
+        write_json(args.report, report)
+
+    if args.rename_captures:
+        renamed = 0
+        for path, key in keys.items():
+            target = os.path.join(args.captures, f"{key}.png")
+            if target != path and not os.path.exists(target):
+                os.replace(path, target)
+                renamed += 1
+        print(f"Renamed {renamed} captures to their new keys")
+    return 1 if any(c["conflict"] for c in report["collisions"]) else 0
+
+
+def cmd_harvest(args):
+    overlay.HASH_DB_FILE = args.db
+    db = overlay.load_database()
+
+    start = time.perf_counter()
+    found = harvest(args.source, args.workers, args.step)
+    print(f"Found {len(found)} distinct hashes in {time.perf_counter() - start:.1f}s")
+
+    # New entries go in the order they first appeared, like hand captures do
+    added = scoped = rare = 0
+    os.makedirs(args.captures, exist_ok=True)
+    aliases = overlay.alias_table(db)
+    for key, (first, seen, regions, crop) in sorted(found.items(), key=lambda item: item[1][0]):
+        key = aliases.get(key, key)
+        if key in db:
+            known = overlay.entry_regions(db[key])
+            if known is not None and not regions <= set(known):
+                known.extend(sorted(regions - set(known)))
+                scoped += 1
+            continue
+        if seen < args.min_frames:
+            rare += 1
+            continue
+        db[key] = {"text": "", "regions": sorted(regions)}
+        path = os.path.join(args.captures, f"{key}.png")
+        if not os.path.exists(path):
+            Image.fromarray(np.ascontiguousarray(crop)).save(path)
+        added += 1
+
+    print(f"Added {added} new entries, widened the regions of {scoped} known ones, "
+          f"skipped {rare} seen on fewer than {args.min_frames} frames")
+    write_json(args.out or args.db, db)
+    print(f"Wrote {args.out or args.db}")
+    return 0
+
+
+def cmd_cluster(args):
+    overlay.HASH_DB_FILE = args.db
+    db = overlay.load_database()
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    overrides = dict(config.get("hash_color_overrides", {}))
+
+    start = time.perf_counter()
+    clusters = cluster_keys(db, args.distance)
+    print(f"{len(clusters)} clusters of near-duplicates among {len(db)} entries "
+          f"({time.perf_counter() - start:.1f}s)")
+    if args.sheets:
+        os.makedirs(args.sheets, exist_ok=True)
+
+    collapsed = conflicts = 0
+    for number, keys in enumerate(clusters):
+        texts = cluster_texts(db, keys)
+        first = int(keys[0], 16)
+        print(f"\nCluster {number}: {len(keys)} entries"
+              + (f", CONFLICTING translations: {texts}" if len(texts) > 1 else ""))
+        for key in keys:
+            png = os.path.join(args.captures, f"{key}.png")
+            print(f"  {key}  d={overlay.hamming(first, int(key, 16)):>2}  "
+                  f"{overlay.entry_text(db[key]).strip()[:40]!r:<44} "
+                  f"{png if os.path.exists(png) else '(no capture)'}")
+        if args.sheets:
+            cluster_sheet(db, keys, args.captures, os.path.join(args.sheets, f"cluster_{number:04d}.png"))
+        if args.collapse:
+            if collapse_cluster(db, overrides, keys) is None:
+                conflicts += 1
+            else:
+                collapsed += 1
+
+    if args.collapse:
+        print(f"\nCollapsed {collapsed} clusters, left {conflicts} with conflicting translations alone")
+        write_json(args.out or args.db, db)
+        print(f"Wrote {len(db)} entries to {args.out or args.db}")
+        if overrides != config.get("hash_color_overrides", {}):
+            config["hash_color_overrides"] = overrides
+            write_json(args.config, config)
+            print(f"Updated colour overrides in {args.config}")
+    return 0
+
+
+def cmd_audit(args):
+    overlay.HASH_DB_FILE = args.db
+    db = overlay.load_database()
+
+    start = time.perf_counter()
+    regions, pairs = audit_collisions(db, overlay.REGION_CFG, args.threshold)
+    print(f"{len(pairs)} pairs of different translations within {args.threshold} bits "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    print("\nregion  entries  closest  safe  configured  conflicts")
+    unsafe = 0
+    for stats in regions:
+        closest = stats["closest"] if stats["closest"] is not None else f">{args.threshold}"
+        safe = stats["safe_distance"] if stats["closest"] is not None else f"{stats['safe_distance']}+"
+        flag = ""
+        if stats["closest"] is not None and stats["match_distance"] > stats["safe_distance"]:
+            flag = "  <- match_distance too high"
+            unsafe += 1
+        print(f"{stats['region']:>6}  {stats['entries']:>7}  {closest!s:>7}  {safe!s:>4}  "
+              f"{stats['match_distance']:>10}  {stats['pairs']:>9}{flag}")
+
+    if pairs:
+        print(f"\nClosest {min(args.limit, len(pairs))} pairs:")
+    for pair in pairs[:args.limit]:
+        (a, b), (text_a, text_b) = pair["keys"], pair["texts"]
+        where = "all" if len(pair["regions"]) == len(regions) else ",".join(map(str, pair["regions"]))
+        print(f"  d={pair['distance']:>2}  {a} {text_a[:30]!r}  vs  {b} {text_b[:30]!r}  regions {where}")
+
+    if args.report:
+        write_json(args.report, {"threshold": args.threshold, "regions": regions, "pairs": pairs})
+    return 1 if unsafe else 0
+
+
+def cmd_anchor(args):
+    frames = overlay.load_frames(args.source, lazy=True)
+    feed, capture, _ = open_harvest_capture()
+    feed.frame = frames[args.frame]
+    gray = capture.grab_gray()
+    crop = capture.map_crop(args.crop)
+    value = overlay.BatchHasher().hash_rects(gray, [crop])[0]
+    print(overlay.hash_to_key(value))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    compile_ = sub.add_parser("compile", help="compile the JSON database to the binary format")
+    compile_.add_argument("--db", default=overlay.HASH_DB_FILE, help="JSON database to compile")
+    compile_.add_argument("--config", default=overlay.OVERLAY_CONFIG_FILE,
+                          help="overlay config holding hash_color_overrides")
+    compile_.add_argument("-o", "--out", help="output file (default: next to the JSON, .bin)")
+    compile_.set_defaults(func=cmd_compile)
+
+    decompile = sub.add_parser("decompile", help="turn a compiled database back into JSON")
+    decompile.add_argument("compiled", help="compiled database file")
+    decompile.add_argument("--db", default=overlay.HASH_DB_FILE, help="JSON database to write")
+    decompile.add_argument("--config", help="also write hash_color_overrides into this overlay config")
+    decompile.set_defaults(func=cmd_decompile)
+
+    rehash = sub.add_parser("rehash", help="re-key the database by hashing the saved captures again")
+    rehash.add_argument("captures", nargs="?", default=overlay.UNSEEN_DIR,
+                        help="directory of <key>.png captures")
+    rehash.add_argument("--db", default=overlay.HASH_DB_FILE, help="JSON database to migrate")
+    rehash.add_argument("--config", default=overlay.OVERLAY_CONFIG_FILE,
+                        help="overlay config holding hash_color_overrides")
+    rehash.add_argument("-o", "--out", required=True, help="migrated JSON database to write")
+    rehash.add_argument("--config-out", help="write the config with migrated colour overrides here")
+    rehash.add_argument("--report", help="write collisions, orphans and the key map as JSON")
+    rehash.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    rehash.add_argument("--rename-captures", action="store_true",
+                        help="rename the captures to their new keys afterwards")
+    rehash.set_defaults(func=cmd_rehash)
+
+    harvest_ = sub.add_parser("harvest", help="add every new hash in a recording as an empty entry")
+    harvest_.add_argument("source", help="video file, directory of PNGs or packed .npy of frames")
+    harvest_.add_argument("--db", default=overlay.HASH_DB_FILE, help="JSON database to extend")
+    harvest_.add_argument("-o", "--out", help="database to write (default: update --db in place)")
+    harvest_.add_argument("--captures", default=overlay.UNSEEN_DIR,
+                          help="where to save a PNG of each new hash")
+    harvest_.add_argument("--step", type=int, default=1, help="only look at every n-th frame")
+    harvest_.add_argument("--min-frames", type=int, default=3,
+                          help="ignore hashes on screen for fewer frames (transitions, text typing out)")
+    harvest_.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    harvest_.set_defaults(func=cmd_harvest)
+
+    cluster = sub.add_parser("cluster", help="find near-duplicate entries and fold them into aliases")
+    cluster.add_argument("--db", default=overlay.HASH_DB_FILE, help="JSON database to cluster")
+    cluster.add_argument("--config", default=overlay.OVERLAY_CONFIG_FILE,
+                         help="overlay config holding hash_color_overrides")
+    cluster.add_argument("--captures", default=overlay.UNSEEN_DIR, help="directory of <key>.png captures")
+    cluster.add_argument("--distance", type=int, default=4, help="most differing bits within a cluster")
+    cluster.add_argument("--sheets", help="save each cluster's captures as one PNG in this directory")
+    cluster.add_argument("--collapse", action="store_true",
+                         help="fold each cluster into one entry with the others as aliases")
+    cluster.add_argument("-o", "--out", help="database to write (default: update --db in place)")
+    cluster.set_defaults(func=cmd_cluster)
+
+    audit = sub.add_parser("audit", help="report close hashes with different translations, per region")
+    audit.add_argument("--db", default=overlay.HASH_DB_FILE, help="JSON database to audit")
+    audit.add_argument("--threshold", type=int, default=10, help="report pairs at most this many bits apart")
+    audit.add_argument("--limit", type=int, default=20, help="pairs to print (the report has them all)")
+    audit.add_argument("--report", help="write the per-region stats and every pair as JSON")
+    audit.set_defaults(func=cmd_audit)
+
+    anchor = sub.add_parser("anchor", help="print the hash of a crop of a recorded frame")
+    anchor.add_argument("source", help="PNG, directory of PNGs, packed .npy or video")
+    anchor.add_argument("crop", type=int, nargs=4, metavar=("X", "Y", "W", "H"),
+                        help="screen rect, as in overlay_regions.json")
+    anchor.add_argument("--frame", type=int, default=0, help="frame number within the source")
+    anchor.set_defaults(func=cmd_anchor)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ import json
 import ctypes
 import time
 import threading
+import queue
 from ctypes import wintypes
 
 import pyautogui
@@ -20,14 +21,22 @@ from PyQt5.QtWidgets import (
     QApplication, QWidget, QCheckBox, QPushButton, QPlainTextEdit, QLabel,
     QVBoxLayout, QHBoxLayout, QComboBox, QFrame
 )
-from PyQt5.QtCore import Qt, QTimer, QRect
+from PyQt5.QtCore import Qt, QTimer, QRect, pyqtSignal
 from PyQt5.QtGui import QPainter, QColor, QFont, QFontDatabase, QTextDocument
 
+from starfy4_translation_overlay import (
+    CAPTURE_BACKEND, ScreenCapture, benchmark_backends, compute_capture_rect, flatten_rect,
+    rebase_rect, format_benchmark, alias_table, entry_text, entry_regions
+)
+
 
 # CONFIG
 
 # Database and monitoring settings
 HASH_DB_FILE = "hash_db_v3.json"
+JOURNAL_FILE = "hash_db_v3.journal"
+JOURNAL_BATCH_MS = 50  # gather writes this long before each fsync
+JOURNAL_COMPACT_RECORDS = 500  # fold the journal into the database after this many
 UNSEEN_DIR = "untranslated"
 CHECK_INTERVAL = 1  # milliseconds
 UI_RECT = (1300, 80, 320, 600)
@@ -338,10 +347,128 @@ def load_database():
     return {}
 
 
-def save_database(db):
-    """Save the hash database to file."""
-    with open(HASH_DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(db, f, indent=2, ensure_ascii=False)
+class DatabaseJournal:
+    """Append-only log of database writes, folded into the database later.
+
+    Each record is one JSON line {"key": ..., "entry": ...} holding the full
+    entry after the change, so replaying a record twice is harmless. Records
+    are written and fsynced in batches on a background thread, which keeps its
+    own copy of the database to compact from without touching the GUI's.
+
+    A failed write is reported through log (called from the writer thread)
+    and retried with the next batch, so edits are only lost if they still
+    cannot be written on close.
+    """
+
+    def __init__(self, log=print):
+        self.records = queue.Queue()
+        self.log = log
+        self._db = {}
+        self._replayed = 0
+        self._thread = None
+
+    def load(self):
+        """Load the database with the journal replayed on top and start writing."""
+        db = load_database()
+        replayed = 0
+        if os.path.exists(JOURNAL_FILE):
+            with open(JOURNAL_FILE, "r+b") as f:
+                good = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        break
+                    db[record["key"]] = record["entry"]
+                    replayed += 1
+                    good += len(line)
+                # Drop a torn write left by a crash so new records follow the last good one
+                f.truncate(good)
+        self._db = json.loads(json.dumps(db))
+        self._replayed = replayed
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return db
+
+    def record(self, key, entry):
+        """Queue a write of one entry; costs the same however big the database is."""
+        self.records.put(json.dumps({"key": key, "entry": entry}, ensure_ascii=False))
+
+    def close(self):
+        """Flush outstanding records and compact the journal into the database."""
+        if self._thread:
+            self.records.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        pending = self._replayed
+        unwritten = []
+        running = True
+        while running:
+            batch = [self.records.get()]
+            time.sleep(JOURNAL_BATCH_MS / 1000)
+            while not self.records.empty():
+                batch.append(self.records.get())
+            if None in batch:
+                running = False
+                batch = batch[:batch.index(None)]
+
+            unwritten += batch
+            try:
+                self._append(unwritten)
+            except OSError as e:
+                if running:
+                    self.log(f"[ERROR] Could not write {JOURNAL_FILE}, will retry "
+                             f"{len(unwritten)} unsaved edit(s): {e}")
+                else:
+                    # Qt is shutting down, so the log window may never show this
+                    print(f"[ERROR] Could not write {JOURNAL_FILE}, "
+                          f"{len(unwritten)} edit(s) lost: {e}", file=sys.stderr)
+                continue
+            for line in unwritten:
+                record = json.loads(line)
+                self._db[record["key"]] = record["entry"]
+            pending += len(unwritten)
+            unwritten = []
+
+            if pending >= JOURNAL_COMPACT_RECORDS or (not running and pending):
+                try:
+                    self._compact()
+                except OSError as e:
+                    # The journal still holds everything, so this is retried later
+                    self.log(f"[ERROR] Could not update {HASH_DB_FILE}: {e}")
+                    continue
+                pending = 0
+
+    def _append(self, lines):
+        """Append and fsync records, cutting off anything half-written on failure."""
+        if not lines:
+            return
+        with open(JOURNAL_FILE, "a", encoding="utf-8") as journal:
+            start = journal.tell()
+            try:
+                journal.write("".join(line + "\n" for line in lines))
+                journal.flush()
+                os.fsync(journal.fileno())
+            except OSError:
+                try:
+                    journal.truncate(start)
+                except OSError:
+                    pass  # load() drops a torn last record anyway
+                raise
+
+    def _compact(self):
+        """Atomically rewrite the database, then start an empty journal."""
+        temp = HASH_DB_FILE + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(self._db, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, HASH_DB_FILE)
+        open(JOURNAL_FILE, "w").close()
 
 
 def normalize_image(img):
@@ -568,9 +695,10 @@ class RulerWindow(QWidget):
 class RegionController:
     """Controller for managing translation overlays for specific screen regions."""
     
-    def __init__(self, config, app):
+    def __init__(self, config, app, region_index=None):
         self.config = config
         self.app = app
+        self.region_index = region_index
         self.overlay = None
         self.patches = []
         self.last_hash = None
@@ -604,9 +732,14 @@ class RegionController:
         x, y, w, h = self.config["crop"]
         cropped_image = screenshot.crop((x, y, x + w, y + h))
         
-        # Exact hash look-up
+        # Exact hash look-up, limited to entries captured from this region
         hash_key = str(get_perceptual_hash(cropped_image))
-        translation_text = database.get(hash_key, "").strip()
+        hash_key = self.app.aliases.get(hash_key, hash_key)
+        entry = database.get(hash_key, "")
+        regions = entry_regions(entry)
+        translation_text = ""
+        if regions is None or self.region_index in regions:
+            translation_text = entry_text(entry).strip()
 
         if translation_text:
             # Decide the overlay background color
@@ -707,7 +840,8 @@ class CGController:
         x, y, w, h = crop_rect
         cropped_image = screenshot.crop((x, y, x + w, y + h))
         hash_key = str(get_perceptual_hash(cropped_image))
-        tag = self.app.db.get(hash_key, "").strip()
+        hash_key = self.app.aliases.get(hash_key, hash_key)
+        tag = entry_text(self.app.db.get(hash_key, "")).strip()
 
         if not self.is_running and tag == "__START_CG__":
             self._start_cg()
@@ -738,6 +872,9 @@ class CGController:
 
 class ControlPanel(QWidget):
     """Main control panel for the translation overlay system."""
+
+    message_logged = pyqtSignal(str)  # log() for other threads
+    capture_picked = pyqtSignal(str)  # fastest capture backend, from the benchmark thread
     
     def __init__(self):
         super().__init__(None, Qt.WindowStaysOnTopHint)
@@ -747,7 +884,9 @@ class ControlPanel(QWidget):
         # Application state
         self.translation_enabled = True
         self.cg_enabled = True
-        self.db = load_database()
+        self.journal = DatabaseJournal(self.message_logged.emit)
+        self.db = self.journal.load()
+        self.aliases = alias_table(self.db)  # near-duplicates folded by dbtools cluster
         self.current_hash = None
         self.ruler_window = None
 
@@ -830,17 +969,46 @@ class ControlPanel(QWidget):
         self.btn_preview.clicked.connect(self.preview_current)
         self.btn_save.clicked.connect(self.save_current)
         self.btn_rect.clicked.connect(self.measure_rect)
+        self.message_logged.connect(self.log)
+        self.capture_picked.connect(self._open_capture)
 
     def _initialize_controllers(self):
         """Initialize region and CG controllers."""
-        self.region_controllers = [RegionController(config, self) for config in REGION_CFG]
+        self.region_controllers = [
+            RegionController(config, self, index) for index, config in enumerate(REGION_CFG)
+        ]
         self.cg_controller = CGController(CG_CFG, self)
+
+        # Hash captures use the overlay's fastest capture backend; timing them
+        # takes a moment, so it happens off the GUI thread
+        self.capture = None
+        self.capture_rect = compute_capture_rect(REGION_CFG, CG_CFG)
+        if CAPTURE_BACKEND == "auto":
+            threading.Thread(target=self._benchmark_capture, daemon=True).start()
+        else:
+            self._open_capture(CAPTURE_BACKEND)
         
         # Start main update timer
         self.update_timer = QTimer()
         self.update_timer.timeout.connect(self._update_tick)
         self.update_timer.start(CHECK_INTERVAL)
 
+    def _benchmark_capture(self):
+        """Time the capture backends on a background thread and pick the fastest."""
+        results, backends = benchmark_backends(self.capture_rect)
+        for backend in backends.values():
+            backend.close()  # reopened on the GUI thread, which is the one using it
+        for result in results:
+            self.message_logged.emit(format_benchmark(result))
+        if backends:
+            self.capture_picked.emit(results[0]["name"])
+        else:
+            self.message_logged.emit("[ERROR] No screen capture backend works here")
+
+    def _open_capture(self, backend):
+        self.capture = ScreenCapture(self.capture_rect, backend)
+        self.log(f"Capturing with {self.capture.backend.name}")
+
     def _start_hotkey_thread(self):
         """Start background thread for hotkey monitoring."""
         def hotkey_loop():
@@ -881,18 +1049,29 @@ class ControlPanel(QWidget):
 
     def capture_hash(self):
         """Capture and hash the current active region."""
-        x, y, w, h = self._get_active_crop_rect()
-        screenshot = pyautogui.screenshot().crop((x, y, x + w, y + h))
+        if self.capture is None:
+            self.log("Screen capture is not ready yet")
+            return
+        x, y, w, h = rebase_rect(flatten_rect(self._get_active_crop_rect()), self.capture.origin)
+        screenshot = self.capture.grab().crop((x, y, x + w, y + h))
         hash_key = str(get_perceptual_hash(screenshot))
+        hash_key = self.aliases.get(hash_key, hash_key)
         
         if hash_key not in self.db:
             os.makedirs(UNSEEN_DIR, exist_ok=True)
             screenshot.save(os.path.join(UNSEEN_DIR, f"{hash_key}.png"))
-            self.db[hash_key] = ""
-            save_database(self.db)
+            self.db[hash_key] = {"text": "", "regions": [ACTIVE_REGION]}
+            self.journal.record(hash_key, self.db[hash_key])
             self.log(f"NEW hash {hash_key} added")
+        else:
+            # Remember every region a known hash shows up in
+            regions = entry_regions(self.db[hash_key])
+            if regions is not None and ACTIVE_REGION not in regions:
+                regions.append(ACTIVE_REGION)
+                self.journal.record(hash_key, self.db[hash_key])
+                self.log(f"Hash {hash_key} also seen in region {ACTIVE_REGION}")
         
-        self.set_current_hash(hash_key, self.db.get(hash_key, ""))
+        self.set_current_hash(hash_key, entry_text(self.db.get(hash_key, "")))
 
     def preview_current(self):
         """Show preview of current translation."""
@@ -913,8 +1092,13 @@ class ControlPanel(QWidget):
         if not self.current_hash:
             return
         
-        self.db[self.current_hash] = self.edit_translation.toPlainText()
-        save_database(self.db)
+        text = self.edit_translation.toPlainText()
+        entry = self.db.get(self.current_hash)
+        if isinstance(entry, dict):
+            entry["text"] = text
+        else:
+            self.db[self.current_hash] = text
+        self.journal.record(self.current_hash, self.db[self.current_hash])
         self.log(f"Saved translation for {self.current_hash}")
 
     def measure_rect(self):
@@ -970,6 +1154,7 @@ def main():
 
     # Create and run control panel
     control_panel = ControlPanel()
+    app.aboutToQuit.connect(control_panel.journal.close)
     sys.exit(app.exec_())
 
 
@@ -0,0 +1,301 @@
+"""
+Headless replay and benchmark for the detection pipeline.
+
+Feeds recorded frames through the same ControlPanel tick the live tool runs,
+with Qt on the offscreen platform and the CG video stubbed out, so it works on
+a Linux box with no emulator or display.
+
+    python starfy4_translation_overlay_replay.py record frames/ --count 600
+    python starfy4_translation_overlay_replay.py replay frames/ --report out.json
+    python starfy4_translation_overlay_replay.py replay frames.npy --expect out.json
+    python starfy4_translation_overlay_replay.py capture-bench
+
+Frames are either a directory of PNGs (replayed in name order) or a packed
+.npy array of shape (frames, height, width, 3). Each frame may be a full
+desktop screenshot or just the capture rect the tool grabs.
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+import starfy4_translation_overlay as overlay
+
+
+# STUBS
+
+class ReplayCGController(overlay.CGController):
+    """CG controller that tracks start/stop without touching VLC."""
+
+    def _create_player(self):
+        return None
+
+    def _start_cg(self):
+        self.is_running = True
+        self.app.log("CG started")
+
+    def _stop_cg(self):
+        self.is_running = False
+        self.app.log("CG stopped")
+
+
+class ReplayPanel(overlay.ControlPanel):
+    """Control panel driven by hand instead of by its timer."""
+
+    cg_controller_class = ReplayCGController
+
+    def __init__(self, frames, quiet=True):
+        self.frames = frames
+        self.quiet = quiet
+        super().__init__()
+
+    def _load_controllers(self):
+        # Frames are only fed in once the panel is fully built
+        self._initialize_controllers(self._build_controllers())
+
+    def _create_capture(self, rect):
+        return overlay.ScreenCapture(rect, overlay.FileCapture(rect, self.frames))
+
+    def _start_worker(self):
+        # Ticks are driven synchronously through _update_tick
+        pass
+
+    def log(self, message):
+        timestamp = time.strftime("%H:%M:%S")
+        self.log_display.appendPlainText(f"[{timestamp}] {message}")
+        if not self.quiet:
+            print(message)
+
+
+# REPORTING
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), round(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples_ms):
+    """Count, mean and p50/p90/p95/p99/max of a list of millisecond timings."""
+    ordered = sorted(samples_ms)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+def run_replay(frames, loops=1, warmup=5, quiet=True):
+    """Replay frames through a ReplayPanel and collect timings and detections."""
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    overlay.load_nds_font()
+    panel = ReplayPanel(frames, quiet=quiet)
+
+    # Warm up on the first frame, then start the replay from a clean slate
+    for _ in range(warmup):
+        panel.worker.capture.backend.index = 0
+        panel._update_tick()
+        app.processEvents()
+    panel.worker.capture.backend.index = 0
+    for controller in panel.region_controllers:
+        controller.hide()
+    panel.cg_controller.is_running = False
+    # Forget what warmup saw, or frame 0 looks unchanged and goes unreported
+    panel.worker.invalidate()
+    panel.worker._showing.clear()
+    panel.worker._stale.clear()
+    overlay.TICK_STATS.reset()
+    overlay.TRACER.spans.clear()
+
+    tick_ms = []
+    paint_ms = []
+    detections = []
+    last_seen = [None] * len(panel.region_controllers)
+    cg_running = False
+
+    for tick in range(len(frames) * loops):
+        start = time.perf_counter()
+        panel._update_tick()
+        ticked = time.perf_counter()
+        app.processEvents()
+        painted = time.perf_counter()
+
+        tick_ms.append((ticked - start) * 1000)
+        paint_ms.append((painted - ticked) * 1000)
+
+        # Later loops see the same frames, so only the first pass is reported
+        if tick >= len(frames):
+            continue
+        for index, controller in enumerate(panel.region_controllers):
+            if controller.last_hash != last_seen[index]:
+                last_seen[index] = controller.last_hash
+                if controller.last_hash is not None:
+                    detections.append({
+                        "frame": tick, "region": index,
+                        "hash": overlay.hash_to_key(controller.last_hash),
+                    })
+        if panel.cg_controller.is_running != cg_running:
+            cg_running = panel.cg_controller.is_running
+            detections.append({"frame": tick, "region": "cg", "hash": "start" if cg_running else "stop"})
+
+    busy_s = sum(tick_ms) / 1000
+    return {
+        "frames": len(frames),
+        "ticks": len(tick_ms),
+        "fps": len(tick_ms) / busy_s if busy_s else 0.0,
+        "tick_ms": summarize(tick_ms),
+        "paint_ms": summarize(paint_ms),
+        "stages": overlay.TICK_STATS.summary(),
+        "detections": detections,
+    }
+
+
+def print_report(report):
+    """Pretty-print a replay report."""
+    print(f"Frames: {report['frames']}  ticks: {report['ticks']}  "
+          f"throughput: {report['fps']:.1f} ticks/s")
+    for name in ("tick_ms", "paint_ms"):
+        s = report[name]
+        print(f"{name:>9}: mean {s['mean']:.2f}  p50 {s['p50']:.2f}  p90 {s['p90']:.2f}  "
+              f"p95 {s['p95']:.2f}  p99 {s['p99']:.2f}  max {s['max']:.2f}")
+    print("Stages (ms):")
+    for stage, s in report.get("stages", {}).items():
+        print(f"{stage:>11}: n {s['count']:>5}  p50 {s['p50']:.3f}  p95 {s['p95']:.3f}  "
+              f"p99 {s['p99']:.3f}  max {s['max']:.3f}")
+    print(f"Detections: {len(report['detections'])}")
+    for event in report["detections"]:
+        print(f"  frame {event['frame']:>5}  region {event['region']!s:>3}  {event['hash']}")
+
+
+def tag_regions(detections):
+    """Record in the database which region(s) each detected hash came from."""
+    db = overlay.load_database()
+    tagged = set()
+    for event in detections:
+        if event["region"] == "cg" or event["hash"] not in db:
+            continue
+        entry = db[event["hash"]]
+        if isinstance(entry, str):
+            entry = db[event["hash"]] = {"text": entry, "regions": []}
+        regions = entry.setdefault("regions", [])
+        if event["region"] not in regions:
+            regions.append(event["region"])
+            tagged.add(event["hash"])
+    overlay.save_database(db)
+    return len(tagged)
+
+
+# COMMANDS
+
+def cmd_replay(args):
+    overlay.HASH_DB_FILE = args.db
+    frames = overlay.load_frames(args.frames)
+    if not len(frames):
+        print(f"[ERROR] No frames found in {args.frames}")
+        return 1
+
+    overlay.TRACER.enabled = bool(args.trace)
+    report = run_replay(frames, loops=args.loops, warmup=args.warmup, quiet=not args.verbose)
+    print_report(report)
+
+    if args.trace:
+        count = overlay.TRACER.dump(args.trace)
+        print(f"Wrote {count} trace spans to {args.trace}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.tag_regions:
+        tagged = tag_regions(report["detections"])
+        print(f"Scoped {tagged} database entries to the regions they were detected in")
+
+    status = 0
+    if args.expect:
+        with open(args.expect, encoding="utf-8") as f:
+            expected = json.load(f)["detections"]
+        if expected != report["detections"]:
+            print("[FAIL] Detected hash sequence differs from expected")
+            status = 1
+    if args.max_p95 is not None and report["tick_ms"]["p95"] > args.max_p95:
+        print(f"[FAIL] p95 tick {report['tick_ms']['p95']:.2f} ms exceeds {args.max_p95} ms")
+        status = 1
+    return status
+
+
+def cmd_record(args):
+    rect = overlay.compute_capture_rect(
+        overlay.REGION_CFG, overlay.CG_CFG, overlay.NATIVE_CFG, overlay.SCENE_CFG
+    )
+    capture = overlay.ScreenCapture(rect)
+    os.makedirs(args.out, exist_ok=True)
+    print(f"Recording {args.count} frames of {rect} into {args.out}")
+    for index in range(args.count):
+        capture.grab().save(os.path.join(args.out, f"{index:06d}.png"))
+        time.sleep(args.interval / 1000)
+    return 0
+
+
+def cmd_capture_bench(args):
+    rect = overlay.compute_capture_rect(
+        overlay.REGION_CFG, overlay.CG_CFG, overlay.NATIVE_CFG, overlay.SCENE_CFG
+    )
+    print(f"Timing {args.count} grabs of {rect} per backend")
+    results, backends = overlay.benchmark_backends(rect, args.count, args.backends)
+    for backend in backends.values():
+        backend.close()
+    for result in results:
+        print(overlay.format_benchmark(result))
+    if backends:
+        print(f"Fastest: {results[0]['name']}")
+    return 0 if backends else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    replay = sub.add_parser("replay", help="replay recorded frames and benchmark the tick")
+    replay.add_argument("frames", help="directory of PNGs or a packed .npy file")
+    replay.add_argument("--db", default=overlay.HASH_DB_FILE, help="hash database to match against")
+    replay.add_argument("--loops", type=int, default=1, help="replay the frames this many times")
+    replay.add_argument("--warmup", type=int, default=5, help="untimed ticks before measuring")
+    replay.add_argument("--report", help="write the report as JSON")
+    replay.add_argument("--expect", help="fail if detections differ from this JSON report")
+    replay.add_argument("--max-p95", type=float, help="fail if the p95 tick exceeds this many ms")
+    replay.add_argument("--tag-regions", action="store_true",
+                        help="scope every detected entry to the regions it was detected in")
+    replay.add_argument("--trace", help="write a Chrome/Perfetto trace of the replay to this file")
+    replay.add_argument("--verbose", action="store_true", help="echo the app log")
+    replay.set_defaults(func=cmd_replay)
+
+    record = sub.add_parser("record", help="save live captures as a PNG sequence")
+    record.add_argument("out", help="output directory")
+    record.add_argument("--count", type=int, default=300)
+    record.add_argument("--interval", type=int, default=overlay.CHECK_INTERVAL, help="ms between frames")
+    record.set_defaults(func=cmd_record)
+
+    bench = sub.add_parser("capture-bench", help="time every screen capture backend on this machine")
+    bench.add_argument("--count", type=int, default=100, help="grabs per backend")
+    bench.add_argument("--backends", nargs="+", choices=sorted(overlay.CAPTURE_BACKENDS),
+                       help="only time these backends")
+    bench.set_defaults(func=cmd_capture_bench)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()